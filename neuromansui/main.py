@@ -6,45 +6,187 @@ Sui Move smart contracts using LLM-generated code.
 """
 
 import os
+import array
+import atexit
 import subprocess
+import threading
 import time
 import argparse
 import tempfile
 import json
 import shutil
 import re
+import hashlib
+import functools
+import contextlib
 from io import StringIO
+from string import Template
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional, Dict, List
+from typing import Optional, Dict, Iterable, List
 from dotenv import load_dotenv
 import openai
-from neuromansui.prompt_loader import PromptLoader, collect_errors
+
+try:
+    import orjson
+except ImportError:  # optional speedup, see the "fast" extra
+    orjson = None
+
+from neuromansui.prompt_loader import PromptLoader, collect_errors, count_distinct_errors, DEFAULT_SYSTEM_PROMPT
 import datetime
 
 # Import rich for pretty printing
-from rich.console import Console
+from rich import box
+from rich.console import Console, Group
 from rich.table import Table
-import re
+from rich.text import Text
 from rich.progress import Progress, BarColumn, TextColumn, TimeElapsedColumn
 
+import numpy as np
+
 # Import plotly for visualization
 import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
 from plotly.subplots import make_subplots
 import plotly.express as px
 
+# ANSI escape sequences emitted by the compiler
+_ANSI_RE = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
+
+# Text spans flagged in error messages (text between quotes or backticks)
+_SPAN_RE = re.compile(r"[`'\"]([\w\d_]+)[`'\"]")
+
+# Fenced code blocks (```lang ... ```) in prompts shown on the chart page
+_FENCE_RE = re.compile(r"```(\w*)\n(.*?)```", re.DOTALL)
+
+# Diagnostic levels counted as compiler warnings (str.startswith accepts a tuple)
+_WARN_PREFIXES = ("Warn", "warn", "WARN")
+
+
 def strip_ansi(text: str) -> str:
     """
     Remove ANSI escape sequences from the given text.
     """
-    ansi_escape = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
-    return ansi_escape.sub("", text)
+    # Every escape sequence starts with ESC, and most compiler output has none
+    if "\x1b" not in text:
+        return text
+    return _ANSI_RE.sub("", text)
 
 load_dotenv()
-client = openai.OpenAI()
+# The client retries rate-limited (429) and transient failures itself, with
+# exponential backoff that honours the server's Retry-After header
+client = openai.OpenAI(max_retries=6)
 
 # Create a global console instance
 console = Console()
 
+# Model used for all chat completion requests
+LLM_MODEL = "o3-mini"
+
+# Directory for the on-disk LLM response cache (None disables caching)
+_llm_cache_dir: Optional[str] = None
+
+
+def configure_llm_cache(cache_dir: Optional[str]) -> None:
+    """
+    Enable (or disable, when None) the on-disk LLM response cache.
+
+    Args:
+        cache_dir: Directory in which cached responses are stored
+    """
+    global _llm_cache_dir
+    _llm_cache_dir = cache_dir
+
+
+def cached_completion(func):
+    """
+    Decorator that memoizes a chat completion on disk.
+
+    Responses are keyed by the SHA-256 of (model, system prompt, user prompt) plus
+    any extra keyword parameters, and stored as JSON files in the configured cache
+    directory, so identical requests are answered without another round trip to the API.
+    """
+    @functools.wraps(func)
+    def wrapper(model: str, system_prompt: str, prompt: str, **params):
+        if _llm_cache_dir is None:
+            return func(model, system_prompt, prompt, **params)
+
+        key = hashlib.sha256(
+            json.dumps({"m": model, "s": system_prompt, "u": prompt, **params}, sort_keys=True).encode()
+        ).hexdigest()
+        cache_path = os.path.join(_llm_cache_dir, f"{key}.json")
+        if os.path.exists(cache_path):
+            with open(cache_path, "r") as f:
+                return json.load(f)
+
+        content = func(model, system_prompt, prompt, **params)
+        os.makedirs(_llm_cache_dir, exist_ok=True)
+        with open(cache_path, "w") as f:
+            json.dump(content, f)
+        return content
+
+    return wrapper
+
+
+def _prompt_cache_lane(system_prompt: str) -> str:
+    """
+    Derive a stable request identifier from the system prompt.
+
+    OpenAI caches prompts by prefix. Requests in a refinement run share the
+    system prompt and the base prompt, so tagging them with the same `user`
+    routes them to the same cache and keeps the shared prefix warm.
+    """
+    return "neuromansui-" + hashlib.sha256(system_prompt.encode()).hexdigest()[:16]
+
+
+@cached_completion
+def _chat_completion(model: str, system_prompt: str, prompt: str) -> str:
+    """
+    Send a single system + user message exchange to the OpenAI API.
+
+    Args:
+        model: The model to query
+        system_prompt: The system prompt to set the model's behavior
+        prompt: The user prompt
+
+    Returns:
+        The content of the first choice in the response
+    """
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        user=_prompt_cache_lane(system_prompt),
+    )
+    return response.choices[0].message.content
+
+
+@cached_completion
+def _chat_completions(model: str, system_prompt: str, prompt: str, n: int = 1) -> List[str]:
+    """
+    Like _chat_completion, but ask for n independent choices in a single request.
+
+    The choices share the prompt prefill, which makes drafting several candidates
+    much cheaper than sending n separate requests.
+
+    Returns:
+        The content of every choice in the response
+    """
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        n=n,
+        user=_prompt_cache_lane(system_prompt),
+    )
+    return [choice.message.content for choice in response.choices]
+
 
 @dataclass
 class CompilationFeedback:
@@ -52,15 +194,19 @@ class CompilationFeedback:
     Structured feedback produced by the compiler.
 
     Attributes:
-        verbose_output: The full raw output (stderr) from the compiler.
+        verbose_output: The build log the compiler writes to stderr, without its JSON diagnostics.
         error_table: The rendered plain text table with grouped error details.
         summary_table: A plain text table with overall error/warning counts.
         spans_table: (Optional) A table showing flagged text spans extracted from error messages.
+        diagnostics: (Optional) One line per diagnostic with its code, level and location.
+        console_tables: (Optional) The tables rendered for the console, in colour when it supports it.
     """
     verbose_output: str
     error_table: Optional[str] = None
     summary_table: Optional[str] = None
     spans_table: Optional[str] = None
+    diagnostics: Optional[str] = None
+    console_tables: Optional[str] = None
 
     def __str__(self) -> str:
         parts = [f"Verbose Compiler Output:\n{self.verbose_output}"]
@@ -72,6 +218,50 @@ class CompilationFeedback:
             parts.append(f"\nFlagged Text Spans:\n{self.spans_table}")
         return "\n".join(parts)
 
+    def to_prompt_text(self, max_log_lines: int = 20) -> str:
+        """
+        Render a compact version of the feedback for the next LLM prompt.
+
+        The grouped error table replaces the raw compiler output when available,
+        followed by the located diagnostics. Only when those are missing are the
+        last few lines of the build log kept for context.
+
+        Args:
+            max_log_lines: Number of trailing build log lines to include
+
+        Returns:
+            The feedback text
+        """
+        verbose_output = strip_ansi(self.verbose_output)
+        if not self.error_table:
+            return verbose_output
+
+        log_tail = "\n".join(verbose_output.splitlines()[-max_log_lines:])
+        parts = [f"Errors:\n{self.error_table}"]
+        if self.spans_table:
+            parts.append(f"Flagged spans:\n{self.spans_table}")
+        if self.diagnostics:
+            parts.append(f"Diagnostics:\n{self.diagnostics}")
+        elif log_tail:
+            parts.append(f"Compiler output (last {max_log_lines} lines):\n{log_tail}")
+        return "\n".join(parts)
+
+    def to_compiler_output(self) -> str:
+        """
+        Render the compiler's diagnostics as text, as recorded for fine-tuning.
+
+        The build runs with --json-errors, so the build log itself carries no
+        diagnostics; they are taken from the parsed errors, one located line each.
+        Only when those are missing (a successful build, or unparseable output) is
+        the build log returned.
+
+        Returns:
+            The diagnostics, or the build log without ANSI escape sequences
+        """
+        if self.diagnostics:
+            return self.diagnostics
+        return strip_ansi(self.verbose_output)
+
 
 @dataclass
 class CompilationResult:
@@ -90,24 +280,44 @@ class CompilationResult:
     stats: Dict[str, int]
 
 
-def compile_contract(contract_source: str) -> CompilationResult:
+def split_compiler_output(lines: Iterable[bytes]) -> tuple[bytes, bytes]:
     """
-    Compiles a Sui Move contract using the Sui CLI.
+    Separate the JSON diagnostics array from the rest of the compiler output.
+
+    With --json-errors the Sui CLI prints the diagnostics as a JSON array whose
+    opening and closing brackets sit on lines of their own, surrounded by the
+    regular build log lines. Log lines that merely start with a bracket, such
+    as "[warning] ...", stay in the build log. The output is split as raw bytes so that callers only
+    decode the parts they use, and it is consumed line by line so it can be
+    read straight from the compiler's pipe.
 
     Args:
-        contract_source: Source code of the contract to compile
+        lines: The compiler output (stderr), one line at a time
 
     Returns:
-        A CompilationResult object containing:
-         - is_successful: Compilation success flag
-         - status_message: A friendly message indicating success or failure
-         - feedback: Structured feedback (verbose output, error details, statistics)
-         - stats: Summary statistics (total errors, compiler warnings, linter warnings)
+        Tuple of (build log lines, JSON diagnostics lines)
     """
-    temp_dir = tempfile.mkdtemp()
-    try:
-        # Write a basic Move.toml file
-        move_toml = """
+    verbose_lines = []
+    json_lines = []
+    in_json = False
+    for line in lines:
+        stripped = line.rstrip()
+        # The array opens on a "[" line, or on a line starting it with its first
+        # object; an empty array is a single "[]" line
+        if not in_json and (stripped in (b"[", b"[]") or stripped.startswith(b"[{")):
+            in_json = True
+        if in_json:
+            json_lines.append(line)
+            # The array closes on a "]" line, or on its opening line if it fits on one
+            if stripped == b"]" or (len(json_lines) == 1 and stripped.endswith(b"]")):
+                in_json = False
+        else:
+            verbose_lines.append(line)
+    return b"".join(verbose_lines), b"".join(json_lines)
+
+
+# Manifest of the package contracts are compiled in (also shown to the model)
+MOVE_TOML = """
 [package]
 name = "TempContract"
 version = "0.0.1"
@@ -119,143 +329,313 @@ Sui = { git = "https://github.com/MystenLabs/sui.git", subdir = "crates/sui-fram
 [addresses]
 temp_addr = "0x0"
 """
-        with open(os.path.join(temp_dir, "Move.toml"), "w") as f:
-            f.write(move_toml)
-
-        # Create sources directory and write the contract code
-        sources_dir = os.path.join(temp_dir, "sources")
-        os.makedirs(sources_dir, exist_ok=True)
-        with open(os.path.join(sources_dir, "temp_contract.move"), "w") as f:
-            f.write(contract_source)
-
-        # Run the compiler with verbose output
-        verbose_result = subprocess.run(
-            ["sui", "move", "build", "--lint", "--doc", "--generate-struct-layouts"],
-            cwd=temp_dir,
-            capture_output=True,
-            
-            text=True,
-        )
+_MOVE_TOML_BYTES = MOVE_TOML.encode()
 
-        # Run the compiler with JSON errors output (sent to stderr)
-        json_result = subprocess.run(
-            ["sui", "move", "build", "--json-errors"],
-            cwd=temp_dir,
-            capture_output=True,
-            text=True,
-        )
 
-        verbose_output = verbose_result.stderr
+def _write_file(path: str, data: bytes) -> None:
+    """Write bytes to a file with a single unbuffered write."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+
+def _write_file_if_changed(path: str, data: bytes) -> None:
+    """
+    Write bytes to a file unless it already holds exactly those bytes.
+
+    Leaving an unchanged file alone keeps its mtime, so the Move compiler neither
+    re-resolves the dependency graph (Move.toml) nor treats the sources as stale.
+    """
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return
+    except FileNotFoundError:
+        pass
+    _write_file(path, data)
+
+
+@contextlib.contextmanager
+def _open_atomic(path: str):
+    """
+    Open a temporary file next to `path` for binary writing, and rename it into place on success.
+
+    The rename replaces the target in one step, so an interrupted run or a reader
+    watching the save directory never sees a half-written output file. If the
+    block raises, the temporary file is removed and the target is left untouched.
+    Each call gets its own uniquely named temporary file, so concurrent writers of
+    the same path (parallel runs, or candidate and speculative threads) cannot
+    clobber each other's partial output; the last rename wins.
+
+    Args:
+        path: Path of the file to write
+
+    Yields:
+        The temporary file, opened with a large write buffer
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or ".")
+    try:
+        # mkstemp creates the file private to the user; outputs get the usual mode
+        os.fchmod(fd, 0o644)
+        with open(fd, "wb", buffering=1 << 20) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _write_atomic(path: str, chunks: Iterable[bytes]) -> None:
+    """
+    Write byte chunks to a file atomically, see `_open_atomic`.
+
+    Args:
+        path: Path of the file to write
+        chunks: The file's contents, written in order
+    """
+    with _open_atomic(path) as f:
+        f.writelines(chunks)
+
+
+def init_move_project(project_dir: str) -> None:
+    """
+    Write the Move package skeleton (Move.toml and sources/) used to compile contracts.
+
+    Args:
+        project_dir: Directory in which to create the package
+    """
+    os.makedirs(os.path.join(project_dir, "sources"), exist_ok=True)
+    _write_file_if_changed(os.path.join(project_dir, "Move.toml"), _MOVE_TOML_BYTES)
+
+
+# Build packages live on a RAM-backed tmpfs where one exists (Linux), otherwise in
+# the default temporary directory
+_TMP_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Package used by compile_contract calls that do not pass their own, created on first use
+_build_dir: Optional[str] = None
+_build_dir_lock = threading.Lock()
+
+
+def _get_build_dir() -> str:
+    """
+    Return the process-wide Move package, creating it on first use.
+
+    The package is kept for the lifetime of the process so its build cache stays
+    warm, and removed at exit.
+    """
+    global _build_dir
+    if _build_dir is None:
+        _build_dir = tempfile.mkdtemp(prefix="neuromansui-", dir=_TMP_ROOT)
+        init_move_project(_build_dir)
+        atexit.register(shutil.rmtree, _build_dir, ignore_errors=True)
+    return _build_dir
+
+
+# Compilation results memoized by the SHA-256 of the contract source, least
+# recently used first. Only the newest _COMPILE_CACHE_SIZE results are kept.
+_COMPILE_CACHE_SIZE = 128
+_compile_cache: Dict[str, CompilationResult] = OrderedDict()
+_compile_cache_lock = threading.Lock()
 
-        if verbose_result.returncode == 0:
-            feedback = CompilationFeedback(verbose_output=verbose_output)
-            return CompilationResult(
-                is_successful=True,
-                status_message="[bold green]Compilation Successful! ✅[/bold green]",
-                feedback=feedback,
-                stats={"errors": 0, "compiler_warnings": 0, "linter_warnings": 0},
-            )
-        else:
-            # Initialize grouped_errors dictionary
-            grouped_errors = {}
-            try:
-                grouped_errors = collect_errors(json_result.stderr)
-
-            except ValueError as e:
-                feedback = CompilationFeedback(
-                    verbose_output=verbose_output
-                )
-                return CompilationResult(
-                    is_successful=False,
-                    status_message="[bold red]Compilation Error! ❌[/bold red]",
-                    feedback=CompilationFeedback(
-                        verbose_output=f"Error extracting error details: {e}\nVerbose Output:\n" + strip_ansi(verbose_output)
-                    ),
-                    stats={},
-                )
 
-            # Build a rich table for error details
-            error_table = Table(title="Compilation Error Summary", show_lines=True)
-            error_table.add_column("Error Code", style="bold cyan", justify="center")
-            error_table.add_column("Occurrences", style="bold yellow", justify="center")
-            error_table.add_column("Level", style="green", justify="center")
-            error_table.add_column("Sample Message", style="magenta")
-
-            total_errors = 0
-            total_compiler_warnings = 0
-            total_linter_warnings = 0
-
-            for code, errors in grouped_errors.items():
-                sample_error = errors[0]
-                level = sample_error.get("level", "Unknown")
-                count = len(errors)
-                total_errors += count
-                if level.lower().startswith("warn"):
-                    total_compiler_warnings += count  # Extend logic if linter warnings differ.
-                error_table.add_row(f"🚨 {code}", str(count), level, sample_error.get("msg", ""))
-
-            # Capture rendered error table as plain text (without ANSI codes)
-            capture_console = Console(record=True, width=120)
-            capture_console.print(error_table)
-            error_table_text = capture_console.export_text(styles=False)
-
-            # Build a summary table for overall statistics
-            summary_table = Table(show_header=False, box=None)
-            summary_table.add_row("  Total Errors:", f"[bold red]{total_errors}[/bold red]")
-            summary_table.add_row("  Total Compiler Warnings:", f"[bold yellow]{total_compiler_warnings}[/bold yellow]")
-            summary_table.add_row("  Total Linter Warnings:", f"[bold blue]{total_linter_warnings}[/bold blue]")
-            capture_console = Console(record=True, width=120)
-            capture_console.print(summary_table)
-            summary_table_text = capture_console.export_text(styles=False)
-
-            # Extract flagged text spans from error messages (for example, text between quotes or backticks)
-            span_pattern = re.compile(r"[`'\"]([\w\d_]+)[`'\"]")
-            span_counts = {}
-            for errors in grouped_errors.values():
-                for err in errors:
-                    msg = err.get("msg", "")
-                    spans = span_pattern.findall(msg)
-                    for span in spans:
-                        span_counts[span] = span_counts.get(span, 0) + 1
-
-            spans_table_text = None
-            if span_counts:
-                spans_table = Table(title="Flagged Text Spans", show_lines=True)
-                spans_table.add_column("Span", style="bold cyan", justify="center")
-                spans_table.add_column("Occurrences", style="bold yellow", justify="center")
-                for span, count in span_counts.items():
-                    spans_table.add_row(span, str(count))
-                capture_console = Console(record=True, width=80)
-                capture_console.print(spans_table)
-                spans_table_text = capture_console.export_text(styles=False)
+def compile_contract(contract_source: str, project_dir: Optional[str] = None) -> CompilationResult:
+    """
+    Compiles a Sui Move contract using the Sui CLI.
 
+    Args:
+        contract_source: Source code of the contract to compile
+        project_dir: A Move package created by init_move_project. Reusing the same
+            directory across calls keeps the build cache (and the resolved Sui
+            framework) warm. If omitted, a package shared by the whole process is used.
+
+    Returns:
+        A CompilationResult object containing:
+         - is_successful: Compilation success flag
+         - status_message: A friendly message indicating success or failure
+         - feedback: Structured feedback (verbose output, error details, statistics)
+         - stats: Summary statistics (total errors, compiler warnings, linter warnings)
+
+    Results are memoized by a hash of the contract source, so resubmitting an
+    identical contract returns the previous result without invoking the compiler.
+    Builds whose diagnostics could not be parsed are not memoized.
+    """
+    source_hash = hashlib.sha256(contract_source.encode()).hexdigest()
+    with _compile_cache_lock:
+        cached_result = _compile_cache.get(source_hash)
+        if cached_result is not None:
+            _compile_cache.move_to_end(source_hash)
+            return cached_result
+
+    if project_dir is None:
+        # Callers without their own package share one, one build at a time
+        with _build_dir_lock:
+            result = _build_contract(contract_source, _get_build_dir())
+    else:
+        result = _build_contract(contract_source, project_dir)
+
+    # A failure whose diagnostics could not be parsed has no stats; building
+    # the same source again may well succeed in extracting them
+    if result.stats:
+        with _compile_cache_lock:
+            _compile_cache[source_hash] = result
+            if len(_compile_cache) > _COMPILE_CACHE_SIZE:
+                _compile_cache.popitem(last=False)
+    return result
+
+
+def _build_contract(contract_source: str, project_dir: str) -> CompilationResult:
+    """
+    Run the Sui compiler on a contract and turn its output into a CompilationResult.
+
+    See compile_contract for the arguments and return value.
+    """
+    # Only the contract source changes between compilations
+    _write_file_if_changed(os.path.join(project_dir, "sources", "temp_contract.move"), contract_source.encode())
+
+    # Run the compiler once; the JSON diagnostics and the human-readable
+    # build log are both written to stderr, which is split while the build
+    # is still running. Nothing useful is printed to stdout.
+    with subprocess.Popen(
+        ["sui", "move", "build", "--json-errors", "--lint"],
+        cwd=project_dir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    ) as proc:
+        verbose_bytes, json_output = split_compiler_output(proc.stderr)
+        returncode = proc.wait()
+
+    # Only the build log is decoded here; the JSON part goes straight to collect_errors
+    verbose_output = verbose_bytes.decode("utf-8", errors="replace")
+
+    if returncode == 0:
+        feedback = CompilationFeedback(verbose_output=verbose_output)
+        return CompilationResult(
+            is_successful=True,
+            status_message="[bold green]Compilation Successful! ✅[/bold green]",
+            feedback=feedback,
+            stats={"errors": 0, "compiler_warnings": 0, "linter_warnings": 0},
+        )
+    else:
+        # Initialize grouped_errors dictionary
+        grouped_errors = {}
+        try:
+            grouped_errors = collect_errors(json_output)
+
+        except ValueError as e:
             feedback = CompilationFeedback(
-                verbose_output=verbose_output,
-                error_table=error_table_text,
-                summary_table=summary_table_text,
-                spans_table=spans_table_text
+                verbose_output=verbose_output
             )
-
-            result = CompilationResult(
+            return CompilationResult(
                 is_successful=False,
                 status_message="[bold red]Compilation Error! ❌[/bold red]",
-                feedback=feedback,
-                stats={
-                    "errors": total_errors,
-                    "compiler_warnings": total_compiler_warnings,
-                    "linter_warnings": total_linter_warnings,
-                },
+                feedback=CompilationFeedback(
+                    verbose_output=f"Error extracting error details: {e}\nVerbose Output:\n" + strip_ansi(verbose_output)
+                ),
+                stats={},
             )
-            
-            # Add the parsed error groups to the result as an additional attribute
-            result.grouped_errors = grouped_errors
-            
-            return result
-    finally:
-        shutil.rmtree(temp_dir)
+
+        # Build a rich table for error details
+        # The feedback tables are sent to the model, so they use single-byte ASCII
+        # borders instead of box-drawing glyphs (three UTF-8 bytes each)
+        error_table = Table(title="Compilation Error Summary", show_lines=True, box=box.ASCII)
+        error_table.add_column("Error Code", style="bold cyan", justify="center")
+        error_table.add_column("Occurrences", style="bold yellow", justify="center")
+        error_table.add_column("Level", style="green", justify="center")
+        error_table.add_column("Sample Message", style="magenta")
+
+        # One row per distinct message; repeated diagnostics are only counted
+        distinct_errors = count_distinct_errors(grouped_errors)
+        total_errors = sum(count for _, _, _, count in distinct_errors)
+        # Extend logic if linter warnings differ.
+        total_compiler_warnings = sum(
+            count for _, level, _, count in distinct_errors if level.startswith(_WARN_PREFIXES)
+        )
+        total_linter_warnings = 0
+        for code, level, msg, count in distinct_errors:
+            error_table.add_row(f"🚨 {code}", str(count), level, msg)
+
+        # Render the tables once into a buffer (in colour when the terminal supports
+        # it) and slice it per table. Markup is off: the cells are plain messages.
+        buffer = StringIO()
+        capture_console = Console(
+            file=buffer, width=120, force_terminal=console.is_terminal, highlight=False, markup=False
+        )
+        capture_console.print(error_table)
+        error_table_end = buffer.tell()
+
+        # The summary is just three counts
+        summary_table_text = (
+            f"  Total Errors:            {total_errors}\n"
+            f"  Total Compiler Warnings: {total_compiler_warnings}\n"
+            f"  Total Linter Warnings:   {total_linter_warnings}\n"
+        )
+        buffer.write(summary_table_text)
+
+        # Extract flagged text spans from error messages (for example, text between quotes or backticks)
+        # in a single regex pass over all messages. Spans cannot straddle the
+        # newline separators because \w does not match them.
+        span_counts = Counter(_SPAN_RE.findall(
+            "\n".join(err.get("msg", "") for errors in grouped_errors.values() for err in errors)
+        ))
+
+        spans_table_text = None
+        if span_counts:
+            spans_table = Table(title="Flagged Text Spans", show_lines=True, box=box.ASCII)
+            spans_table.add_column("Span", style="bold cyan", justify="center")
+            spans_table.add_column("Occurrences", style="bold yellow", justify="center")
+            for span, count in span_counts.items():
+                spans_table.add_row(span, str(count))
+            capture_console.print(spans_table)
+
+        # The tables are printed by the caller: candidates compile in worker
+        # threads, and only the selected one's tables are shown
+        rendered = buffer.getvalue()
+        error_table_text = strip_ansi(rendered[:error_table_end])
+        if span_counts:
+            spans_table_text = strip_ansi(rendered[error_table_end + len(summary_table_text):])
+
+        # The JSON diagnostics carry the locations the build log would show
+        diagnostics = "\n".join(
+            f"{code} [{err.get('level', 'Unknown')}] at {err.get('file', '?')}:{err.get('line', '?')}: {err.get('msg', '')}"
+            for code, errors in grouped_errors.items()
+            for err in errors
+        )
+
+        feedback = CompilationFeedback(
+            verbose_output=verbose_output,
+            error_table=error_table_text,
+            summary_table=summary_table_text,
+            spans_table=spans_table_text,
+            diagnostics=diagnostics,
+            console_tables=rendered,
+        )
+
+        result = CompilationResult(
+            is_successful=False,
+            status_message="[bold red]Compilation Error! ❌[/bold red]",
+            feedback=feedback,
+            stats={
+                "errors": total_errors,
+                "compiler_warnings": total_compiler_warnings,
+                "linter_warnings": total_linter_warnings,
+            },
+        )
+        
+        # Add the parsed error groups to the result as an additional attribute
+        result.grouped_errors = grouped_errors
+        
+        return result
 
 
-def generate_contract(prompt: str, system_prompt: str = "You are an expert in Sui Move smart contract development.") -> str:
+def generate_contract(prompt: str, system_prompt: str = DEFAULT_SYSTEM_PROMPT) -> str:
     """
     Use OpenAI API to generate contract code.
     
@@ -270,19 +650,37 @@ def generate_contract(prompt: str, system_prompt: str = "You are an expert in Su
     console.print("[italic]Prompt being sent to the model:[/italic]")
     console.print(f"[dim]{prompt}[/dim]")
     with console.status("[bold blue]Awaiting OpenAI response...[/bold blue]", spinner="dots"):
-        response = client.chat.completions.create(
-            model="o3-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-        )
-    generated = response.choices[0].message.content
+        generated = _chat_completion(LLM_MODEL, system_prompt, prompt)
     console.print("[bold green]✅ Contract generation successful![/bold green]")
     return generated
 
 
-def iterative_evaluation(base_prompt: str, system_prompt: str = None, max_iterations: int = 5) -> tuple[str, list]:
+def generate_contracts(prompt: str, system_prompt: str = DEFAULT_SYSTEM_PROMPT, n: int = 1) -> List[str]:
+    """
+    Use OpenAI API to generate several candidate contracts from one request.
+
+    Args:
+        prompt: The prompt to send to the model
+        system_prompt: The system prompt to set the model's behavior
+        n: Number of candidates to generate
+
+    Returns:
+        List of generated contract source codes
+    """
+    if n == 1:
+        return [generate_contract(prompt, system_prompt)]
+
+    console.print(f"[bold green]🛠️ Requesting {n} candidate contracts from OpenAI...[/bold green]")
+    console.print("[italic]Prompt being sent to the model:[/italic]")
+    console.print(f"[dim]{prompt}[/dim]")
+    with console.status("[bold blue]Awaiting OpenAI response...[/bold blue]", spinner="dots"):
+        candidates = _chat_completions(LLM_MODEL, system_prompt, prompt, n=n)
+    console.print(f"[bold green]✅ Generated {len(candidates)} candidates![/bold green]")
+    return candidates
+
+
+def iterative_evaluation(base_prompt: str, system_prompt: str = None, max_iterations: int = 5,
+                         speculative: bool = False, num_candidates: int = 1) -> tuple[str, list]:
     """
     Iteratively calls the LLM to refine the contract source code.
     
@@ -290,46 +688,114 @@ def iterative_evaluation(base_prompt: str, system_prompt: str = None, max_iterat
         base_prompt: The base prompt to use for generation
         system_prompt: The system prompt to set the model's behavior
         max_iterations: Maximum number of iterations to perform
+        speculative: While a revision compiles, request the next one in the background
+            assuming the compiler feedback will not change. The speculative response is
+            used if the feedback is indeed unchanged and discarded otherwise; the request
+            is already under way by then, so every miss costs an extra paid request.
+        num_candidates: Number of contracts to request per iteration. The candidates are
+            compiled concurrently and the first one that compiles is kept, or else the
+            one with the fewest errors.
         
     Returns:
         Tuple containing:
         - Final contract source code
         - List of detailed iteration data for fine-tuning
+        
+    Raises:
+        ValueError: If num_candidates is less than 1
     """
+    if num_candidates < 1:
+        raise ValueError(f"num_candidates must be at least 1, got {num_candidates}")
+    
     previous_stats = None
     feedback_text = "Initial run"
+    previous_feedback_text = None
     contract_source = ""
     
     # For metrics and fine-tuning data
     iterations_history = []
+    iterations_data = []
     fine_tuning_data = []
     
-    # Track error codes across iterations
-    error_histogram = {}
+    # Track error codes across iterations (one unboxed int32 count per iteration)
+    error_histogram: Dict[str, array.array] = {}
 
     if system_prompt is None:
-        system_prompt = "You are an expert in Sui Move smart contract development."
-
-    # Create a progress bar
-    with Progress(
+        system_prompt = DEFAULT_SYSTEM_PROMPT
+
+    # Speculation is pointless with the response cache: the speculative request would
+    # repeat the current prompt and be answered with the current contract. It only
+    # drafts a single contract, so it is not combined with multiple candidates either.
+    use_speculation = speculative and _llm_cache_dir is None and num_candidates == 1
+    executor = ThreadPoolExecutor(max_workers=1) if use_speculation else None
+    speculative_prompt = None
+    speculative_future = None
+
+    # Compile every iteration in the same Move packages (one per candidate) so the
+    # build cache is reused, and show a progress bar
+    with tempfile.TemporaryDirectory(prefix="neuromansui-", dir=_TMP_ROOT) as project_root, Progress(
         TextColumn("[progress.description]{task.description}"),
         BarColumn(),
         TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
         TimeElapsedColumn(),
     ) as progress:
+        project_dirs = [os.path.join(project_root, f"candidate_{k}") for k in range(num_candidates)]
+        for project_dir in project_dirs:
+            init_move_project(project_dir)
         task = progress.add_task("[cyan]Refining contract...\n", total=max_iterations)
         
         for i in range(max_iterations):
+            # With the response cache enabled an unchanged prompt would replay the
+            # previous (failing) contract, so there is nothing left to gain.
+            if _llm_cache_dir is not None and i > 0 and feedback_text == previous_feedback_text:
+                console.print("[yellow]Compiler feedback unchanged since the last iteration; stopping early.[/yellow]")
+                break
+            previous_feedback_text = feedback_text
+
             console.print(f"\n[bold yellow]=== Iteration {i+1}/{max_iterations} ===[/bold yellow]\n")
             full_prompt = base_prompt if i == 0 else f"{base_prompt}\n\nFeedback: {feedback_text}"
-            contract_source = generate_contract(full_prompt, system_prompt)
-            
-            console.print("[bold cyan]Generated contract source:[/bold cyan]")
-            console.print(contract_source)
+            if speculative_future is not None and full_prompt == speculative_prompt:
+                console.print("[bold green]Compiler feedback unchanged; using the speculative generation.[/bold green]")
+                contract_source = speculative_future.result()
+            elif num_candidates > 1:
+                candidates = generate_contracts(full_prompt, system_prompt, num_candidates)
+            else:
+                # On a miss the speculative request is left to finish and its response
+                # is dropped: it started with the compilation, so it is paid for anyway
+                contract_source = generate_contract(full_prompt, system_prompt)
+            speculative_future = None
+
+            if num_candidates > 1:
+                # Compile all candidates at once, each in its own package
+                with ThreadPoolExecutor(max_workers=len(candidates)) as compile_pool:
+                    candidate_results = list(compile_pool.map(compile_contract, candidates, project_dirs))
+                # Prefer a candidate that compiles, then the one with the fewest errors;
+                # results without stats (unparseable output) rank last
+                chosen = min(
+                    range(len(candidates)),
+                    key=lambda k: (
+                        not candidate_results[k].is_successful,
+                        candidate_results[k].stats.get("errors", float("inf")),
+                    ),
+                )
+                contract_source, compiled_result = candidates[chosen], candidate_results[chosen]
+                console.print(f"[bold cyan]Selected candidate {chosen + 1}/{len(candidates)}:[/bold cyan]")
+                console.print(contract_source)
+            else:
+                console.print("[bold cyan]Generated contract source:[/bold cyan]")
+                console.print(contract_source)
+
+                # If this revision fails with the same feedback, the next prompt will be
+                # identical to the current one, so request it while the compiler runs.
+                if executor is not None and i > 0 and i + 1 < max_iterations:
+                    speculative_prompt = full_prompt
+                    speculative_future = executor.submit(_chat_completion, LLM_MODEL, system_prompt, full_prompt)
 
-            compiled_result = compile_contract(contract_source)
+                compiled_result = compile_contract(contract_source, project_dirs[0])
             console.print("[bold magenta]Compiler Feedback:[/bold magenta]")
             console.print(compiled_result.status_message, highlight=False, markup=True)
+            if compiled_result.feedback.console_tables:
+                console.file.write(compiled_result.feedback.console_tables)
             
             # Extract error codes for histogram
             iteration_error_codes = {}
@@ -350,7 +816,7 @@ def iterative_evaluation(base_prompt: str, system_prompt: str = None, max_iterat
                         
                         # Update the global histogram
                         if error_code not in error_histogram:
-                            error_histogram[error_code] = [0] * max_iterations
+                            error_histogram[error_code] = array.array('i', [0]) * max_iterations
                         error_histogram[error_code][i] = len(errors)
                 except Exception as e:
                     console.print(f"[yellow]Warning: Could not extract error codes: {e}[/yellow]")
@@ -365,7 +831,7 @@ def iterative_evaluation(base_prompt: str, system_prompt: str = None, max_iterat
                                 "level": "Error"
                             }
                             if error_code not in error_histogram:
-                                error_histogram[error_code] = [0] * max_iterations
+                                error_histogram[error_code] = array.array('i', [0]) * max_iterations
                             error_histogram[error_code][i] = count
             
             # Create a record of this iteration for fine-tuning
@@ -373,7 +839,7 @@ def iterative_evaluation(base_prompt: str, system_prompt: str = None, max_iterat
                 "iteration": i+1,
                 "prompt": full_prompt,
                 "contract_source": contract_source,
-                "compiler_output": strip_ansi(compiled_result.feedback.verbose_output),
+                "compiler_output": compiled_result.feedback.to_compiler_output(),
                 "is_successful": compiled_result.is_successful,
                 "error_stats": compiled_result.stats,
                 "error_codes": iteration_error_codes,
@@ -392,6 +858,14 @@ def iterative_evaluation(base_prompt: str, system_prompt: str = None, max_iterat
             }
             iterations_history.append(iteration_metrics)
 
+            # Data for the stacked bar chart visualization
+            iterations_data.append({
+                "iteration": i + 1,
+                "total_errors": iteration_metrics["errors"],
+                # Entries are only created for codes that occurred, so no zero counts to drop
+                "error_breakdown": dict(iteration_error_codes),
+            })
+
             delta_str = ""
             if previous_stats is not None and compiled_result.stats:
                 delta_errors = compiled_result.stats.get("errors", 0) - previous_stats.get("errors", 0)
@@ -413,16 +887,17 @@ def iterative_evaluation(base_prompt: str, system_prompt: str = None, max_iterat
                 break
             else:
                 feedback_text = (
-                    f"The contract did not compile.\n\n{strip_ansi(compiled_result.feedback.verbose_output)}\n"
+                    f"The contract did not compile.\n\n{compiled_result.feedback.to_prompt_text()}\n"
                 )
                 if delta_str:
-                    feedback_text += delta_str + "\n"
+                    # Send the delta without its console markup
+                    feedback_text += Text.from_markup(delta_str).plain + "\n"
                 feedback_text += "Please revise the contract accordingly, ensuring that all issues are resolved."
-                time.sleep(1)
     
     # Print summary metrics
     if iterations_history:
-        console.print("\n[bold blue]== Refinement Summary ==[/bold blue]")
+        # Collect the summary widgets and print them in a single render pass
+        summary_widgets = ["\n[bold blue]== Refinement Summary ==[/bold blue]"]
         
         # Create a summary table
         summary_table = Table(title="Refinement Metrics")
@@ -440,11 +915,11 @@ def iterative_evaluation(base_prompt: str, system_prompt: str = None, max_iterat
                 status
             )
         
-        console.print(summary_table)
+        summary_widgets.append(summary_table)
         
         # Print error code histogram if errors were found
         if error_histogram:
-            console.print("\n[bold blue]== Error Code Histogram ==[/bold blue]")
+            summary_widgets.append("\n[bold blue]== Error Code Histogram ==[/bold blue]")
             histogram_table = Table(title="Error Codes by Iteration")
             histogram_table.add_column("Error Code", style="cyan")
             
@@ -461,41 +936,16 @@ def iterative_evaluation(base_prompt: str, system_prompt: str = None, max_iterat
                         row_data.append(str(count) if count > 0 else "-")
                 histogram_table.add_row(*row_data)
             
-            console.print(histogram_table)
+            summary_widgets.append(histogram_table)
 
-    # Prepare data for stacked bar chart visualization
-    iterations_data = []
-    for i in range(len(iterations_history)):
-        iter_data = {
-            "iteration": i + 1,
-            "total_errors": iterations_history[i]["errors"],
-            "error_breakdown": {}
-        }
-        
-        # Add error breakdown by code
-        for error_code, error_info in iterations_history[i]["error_codes"].items():
-            if isinstance(error_info, dict):  # New format with message
-                count = error_info["count"]
-                if count > 0:
-                    iter_data["error_breakdown"][error_code] = {
-                        "count": count,
-                        "message": error_info["message"],
-                        "level": error_info["level"]
-                    }
-            else:  # Old format (just count)
-                count = error_info
-                if count > 0:
-                    iter_data["error_breakdown"][error_code] = {
-                        "count": count,
-                        "message": "Unknown error",
-                        "level": "Error"
-                    }
-        
-        iterations_data.append(iter_data)
+        console.print(Group(*summary_widgets))
+
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
 
     # Add the complete data to fine-tuning data
     fine_tuning_data.append({
-        "error_histogram": error_histogram,
+        "error_histogram": {code: counts.tolist() for code, counts in error_histogram.items()},
         "iterations_data": iterations_data,  # Add data formatted for stacked bar chart
         "total_iterations": len(iterations_history)
     })
@@ -511,13 +961,12 @@ def list_available_prompts(prompt_loader: PromptLoader) -> None:
         prompt_loader: The prompt loader instance
     """
     console.print("[bold underline]Available prompts:[/bold underline]")
-    for prompt_path in prompt_loader.list_prompts():
-        description = prompt_loader.get_prompt_description(prompt_path)
+    for prompt_path, description in prompt_loader.all_descriptions().items():
         console.print(f"- [cyan]{prompt_path}[/cyan]: {description}")
     console.print()
 
 
-def generate_test_file(contract_source: str, system_prompt: str = "You are an expert in Sui Move smart contract development.") -> str:
+def generate_test_file(contract_source: str, system_prompt: str = DEFAULT_SYSTEM_PROMPT) -> str:
     """
     Generate a test file for a given contract using OpenAI.
     
@@ -530,32 +979,481 @@ def generate_test_file(contract_source: str, system_prompt: str = "You are an ex
     """
     console.print("[bold green]🧪 Generating test file for the contract...[/bold green]")
     
+    # Keep the static instructions first and the contract last so requests share a cacheable prefix
     prompt = f"""
-Given the following Sui Move contract:
+Generate a comprehensive test file for the Sui Move contract below that covers all key functionality. 
+Include tests for happy paths and edge cases.
+The test file should follow Sui Move testing best practices and be ready to run with the Sui test framework.
+Include helpful comments that explain what each test is checking.
+
+Contract:
 
 ```
 {contract_source}
 ```
-
-Generate a comprehensive test file for this contract that covers all key functionality. 
-Include tests for happy paths and edge cases.
-The test file should follow Sui Move testing best practices and be ready to run with the Sui test framework.
-Include helpful comments that explain what each test is checking.
     """
     
     with console.status("[bold blue]Generating tests...[/bold blue]", spinner="dots"):
-        response = client.chat.completions.create(
-            model="o3-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-        )
-    generated = response.choices[0].message.content
+        generated = _chat_completion(LLM_MODEL, system_prompt, prompt)
     console.print("[bold green]✅ Test file generation successful![/bold green]")
     return generated
 
 
+@functools.lru_cache(maxsize=None)
+def _classify_level(level: str, is_lint: bool) -> tuple[str, str]:
+    """
+    Classify a diagnostic level for the error chart.
+
+    There are only a handful of distinct (level, lint) combinations, so the
+    result is cached rather than recomputed for every error code and iteration.
+
+    Args:
+        level: The diagnostic level reported by the compiler
+        is_lint: Whether the error code is a lint code
+
+    Returns:
+        Tuple of (description prefix, chart category)
+    """
+    if "BlockingError" in level:
+        return "Error", "Blocking Errors"
+    if "NonblockingError" in level:
+        return "Non-blocking Error", "Non-blocking Errors"
+    if "Warning" in level:
+        return "Warning", "Warnings"
+    if is_lint:
+        return "Lint Warning", "Lint Warnings"
+    return level, "Other"
+
+
+def _summary_text(categories: Dict[str, int], top_errors: List[tuple], improvement_pct: float) -> str:
+    """
+    Build the text of the error chart's summary statistics box.
+
+    Args:
+        categories: Error count for every error category
+        top_errors: (description, count) pairs for the most frequent errors
+        improvement_pct: Percentage improvement from the first to the last iteration
+
+    Returns:
+        The summary text, with lines separated by <br>
+    """
+    top_lines = "<br>".join(
+        f"{i}. {description} ({count})" for i, (description, count) in enumerate(top_errors, 1)
+    )
+    return (
+        f"<b>Summary Statistics</b><br>"
+        f"Total Errors: {sum(categories.values())}<br>"
+        f"Blocking Errors: {categories['Blocking Errors']}<br>"
+        f"Non-blocking Errors: {categories['Non-blocking Errors']}<br>"
+        f"Warnings: {categories['Warnings']}<br>"
+        f"Lint Warnings: {categories['Lint Warnings']}<br>"
+        f"Overall Improvement: {improvement_pct:.1f}%<br>"
+        f"<b>Top Errors:</b><br>{top_lines}"
+    )
+
+
+def _ensure_plotlyjs(directory: str) -> None:
+    """
+    Write the plotly.js bundle that ships with plotly into a directory, unless it is already there.
+
+    Args:
+        directory: Directory of the chart pages that load it
+    """
+    bundle_path = os.path.join(directory or ".", "plotly.min.js")
+    if not os.path.exists(bundle_path):
+        with open(bundle_path, "w", encoding="utf-8") as f:
+            f.write(get_plotlyjs())
+
+
+def _error_colors(error_types: Dict[str, List[str]], palettes: Dict[str, list]) -> Dict[str, str]:
+    """
+    Assign each error code a colour from its type's HSL gradient.
+
+    Args:
+        error_types: Error codes grouped by type ("Error", "NonBlocking", ...)
+        palettes: (start, end) HSL triples for each type, from a chart theme
+
+    Returns:
+        Dictionary mapping error codes to HSL colour strings
+    """
+    colors = {}
+    for type_name, codes in error_types.items():
+        if not codes:
+            continue
+        
+        # Create gradient steps: interpolate between palette start and end based on
+        # position, for all codes of this type at once
+        num_codes = len(codes)
+        start, end = np.array(palettes[type_name])
+        t = np.arange(num_codes) / max(1, num_codes - 1)  # Avoid division by zero
+        hsl = start + t[:, None] * (end - start)
+        for code, (h, s, l) in zip(codes, hsl.tolist()):
+            colors[code] = f"hsl({h}, {s}%, {l}%)"
+    return colors
+
+
+def _watermark_annotation(theme: dict) -> dict:
+    """Watermark-like subtitle shown above the error chart."""
+    return dict(
+        name="watermark",
+        text="Sui Move Compiler Error Analysis",
+        xref="paper",
+        yref="paper",
+        x=0.5,
+        y=1.05,
+        showarrow=False,
+        font=dict(
+            family="Arial, sans-serif",
+            size=14,
+            color=theme["watermark"]
+        )
+    )
+
+
+def _count_annotations(total_errors: List[int], theme: dict) -> List[dict]:
+    """Labels showing the exact error count above each non-empty bar."""
+    return [
+        dict(
+            name="count_label",
+            x=i,
+            y=total + 1,  # Position slightly above the bar
+            text=str(total),
+            showarrow=False,
+            font=dict(
+                size=14, 
+                color=theme["count_label"]
+            )
+        )
+        for i, total in enumerate(total_errors)
+        if total > 0
+    ]
+
+
+# Colours for the light (False) and dark (True) chart themes. The chart page embeds
+# both, so a single file can switch between them.
+_CHART_THEMES = {
+    False: {
+        # HSL gradients per error type; red hues for non-blocking errors, orange for
+        # blocking errors, then yellow, blue and purple
+        "palettes": {
+            "NonBlocking": [(0, 90, 50), (10, 85, 55)],
+            "Error": [(25, 90, 50), (35, 85, 55)],
+            "Warning": [(40, 75, 45), (50, 70, 50)],
+            "Lint": [(200, 75, 55), (220, 70, 60)],
+            "Other": [(290, 50, 55), (310, 50, 60)],
+        },
+        "bg": 'white',
+        "text": '#333',
+        "title": '#1E3A8A',
+        "grid": 'rgba(0, 0, 0, 0.1)',
+        "template": 'plotly_white',
+        "stats_bg": 'rgba(245, 247, 250, 0.85)',  # Light gray/blue
+        "stats_border": 'rgba(200, 200, 200, 0.5)',  # Light gray border
+        "legend_bg": 'rgba(255, 255, 255, 0.5)',
+        "legend_border": 'rgba(0, 0, 0, 0.1)',
+        "watermark": 'rgba(0, 0, 0, 0.2)',
+        "trend_line": 'red',
+        "trend_marker": 'darkred',
+        "count_label": '#111827',
+    },
+    True: {
+        # Higher lightness for better visibility on dark backgrounds
+        "palettes": {
+            "NonBlocking": [(0, 90, 60), (10, 85, 65)],
+            "Error": [(25, 90, 60), (35, 85, 65)],
+            "Warning": [(40, 75, 60), (50, 70, 65)],
+            "Lint": [(200, 75, 65), (220, 70, 70)],
+            "Other": [(290, 50, 65), (310, 50, 70)],
+        },
+        "bg": '#111827',  # Dark gray
+        "text": '#F9FAFB',  # Light gray
+        "title": '#3B82F6',
+        "grid": 'rgba(255, 255, 255, 0.1)',
+        "template": 'plotly_dark',
+        "stats_bg": 'rgba(31, 41, 55, 0.8)',  # Slightly lighter than background
+        "stats_border": 'rgba(75, 85, 99, 0.5)',  # Gray border
+        "legend_bg": 'rgba(255, 255, 255, 0.1)',
+        "legend_border": 'rgba(255, 255, 255, 0.2)',
+        "watermark": 'rgba(255, 255, 255, 0.4)',
+        "trend_line": '#EF4444',
+        "trend_marker": '#B91C1C',
+        "count_label": '#F9FAFB',
+    },
+}
+
+# Hover text for a bar segment with errors in that iteration
+_HOVER_TEXT = (
+    "<b>{label}</b><br>"
+    "Error code: <b>{code}</b><br>"
+    "Level: <b>{level}</b><br>"
+    "Message: <b>{message}</b><br>"
+    "Count: <b>{count}</b><br>"
+    "Percentage: <b>{pct:.1f}%</b>"
+)
+
+# Static parts of the error chart page. They are parsed once at import time and
+# only the theme colours are substituted per chart.
+_CHART_HEAD_TEMPLATE = Template("""
+        <!DOCTYPE html>
+        <html lang="en">
+        <head>
+            <meta charset="UTF-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1.0">
+            <title>Sui Move Contract Analysis</title>
+            <script src="plotly.min.js"></script>
+            <link rel="stylesheet" id="hljs-light" href="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/styles/github.min.css"$light_disabled>
+            <link rel="stylesheet" id="hljs-dark" href="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/styles/atom-one-dark.min.css"$dark_disabled>
+            <script defer src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/highlight.min.js"></script>
+            <script defer src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/languages/rust.min.js"></script>
+            <script defer src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/languages/bash.min.js"></script>
+            <script defer src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/languages/toml.min.js"></script>
+            <script defer src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/languages/markdown.min.js"></script>
+            <style>
+                :root {
+                    --bg: white;
+                    --text: #333;
+                    --title: #1E3A8A;
+                    --tab-border: #ccc;
+                    --tab-bg: #f1f1f1;
+                    --tab-hover-bg: #ddd;
+                    --tab-active-bg: #ccc;
+                    --tabcontent-bg: #fff;
+                    --line-number: #999;
+                    --line-number-border: #ddd;
+                    --console-bg: #F1F5F9;
+                    --console-text: #334155;
+                    --console-border: #CBD5E1;
+                }
+                body.dark {
+                    --bg: #111827;
+                    --text: #F9FAFB;
+                    --title: #3B82F6;
+                    --tab-border: #2D3748;
+                    --tab-bg: #1F2937;
+                    --tab-hover-bg: #374151;
+                    --tab-active-bg: #4B5563;
+                    --tabcontent-bg: #1F2937;
+                    --line-number: #6B7280;
+                    --line-number-border: #4B5563;
+                    --console-bg: #1E293B;
+                    --console-text: #E2E8F0;
+                    --console-border: #475569;
+                }
+                body {
+                    font-family: Arial, sans-serif;
+                    margin: 0;
+                    padding: 0;
+                    background-color: var(--bg);
+                    color: var(--text);
+                }
+                .container {
+                    width: 95%;
+                    margin: 20px auto;
+                    min-height: 85vh; /* Ensure container takes up most of the viewport height */
+                }
+                .tab {
+                    overflow: hidden;
+                    border: 1px solid var(--tab-border);
+                    background-color: var(--tab-bg);
+                    border-radius: 5px 5px 0 0;
+                }
+                .tab button {
+                    background-color: inherit;
+                    float: left;
+                    border: none;
+                    outline: none;
+                    cursor: pointer;
+                    padding: 14px 16px;
+                    transition: 0.3s;
+                    font-size: 16px;
+                    color: var(--text);
+                }
+                .tab button:hover {
+                    background-color: var(--tab-hover-bg);
+                }
+                .tab button.active {
+                    background-color: var(--tab-active-bg);
+                }
+                .tabcontent {
+                    display: none;
+                    padding: 6px 12px;
+                    border: 1px solid var(--tab-border);
+                    border-top: none;
+                    border-radius: 0 0 5px 5px;
+                    animation: fadeEffect 1s;
+                    background-color: var(--tabcontent-bg);
+                    min-height: 70vh; /* Ensure tab content area is tall enough */
+                }
+                @keyframes fadeEffect {
+                    from {opacity: 0;}
+                    to {opacity: 1;}
+                }
+                pre {
+                    margin: 0;
+                    padding: 16px;
+                    overflow: auto;
+                    border-radius: 4px;
+                }
+                code {
+                    font-family: 'Courier New', Courier, monospace;
+                }
+                .code-with-lines {
+                    display: flex;
+                    align-items: flex-start;
+                }
+                /* The gutter and the code are separate blocks, so both get the box and
+                   font metrics of the theme's pre code.hljs (1em padding) to line up */
+                .code-with-lines > pre {
+                    margin: 0;
+                    padding: 0;
+                }
+                .code-with-lines > pre:last-child {
+                    flex: 1;
+                    min-width: 0;
+                }
+                .hljs-line-numbers,
+                .code-with-lines code.hljs {
+                    font-family: 'Courier New', Courier, monospace;
+                    font-size: 14px;
+                    line-height: 1.5;
+                }
+                .hljs-line-numbers {
+                    text-align: right;
+                    padding: 1em 10px 1em 1em;
+                    color: var(--line-number);
+                    border-right: 1px solid var(--line-number-border);
+                    user-select: none;
+                }
+                .theme-toggle {
+                    float: right;
+                    margin-top: 8px;
+                    padding: 8px 14px;
+                    border: 1px solid var(--tab-border);
+                    border-radius: 5px;
+                    background-color: var(--tab-bg);
+                    color: var(--text);
+                    cursor: pointer;
+                }
+                .console-header {
+                    background-color: var(--console-bg);
+                    border-bottom: 1px solid var(--console-border);
+                }
+                .console-body {
+                    background-color: var(--console-bg);
+                }
+                .console-body pre, .console-title {
+                    color: var(--console-text);
+                }
+            </style>
+        </head>
+        <body$body_class>
+            <div class="container">
+                <button class="theme-toggle" id="theme-toggle" onclick="toggleTheme()">Toggle dark mode</button>
+                <h1 style="text-align: center; color: var(--title);">Sui Move Contract Analysis</h1>
+                
+                <div class="tab" id="tabs">
+                    <button class="tablinks active" id="ErrorChartTab">Error Chart</button>
+        """)
+
+# Theme toggle, tab handling and syntax highlighting; contains no per-chart values
+_CHART_SCRIPT = """
+                <script>
+                    // Legacy function for backward compatibility
+                    function openTab(evt, tabName) {
+                        var i, tabcontent, tablinks;
+                        tabcontent = document.getElementsByClassName("tabcontent");
+                        for (i = 0; i < tabcontent.length; i++) {
+                            tabcontent[i].style.display = "none";
+                        }
+                        tablinks = document.getElementsByClassName("tablinks");
+                        for (i = 0; i < tablinks.length; i++) {
+                            tablinks[i].className = tablinks[i].className.replace(" active", "");
+                        }
+                        document.getElementById(tabName).style.display = "block";
+                        evt.currentTarget.className += " active";
+                    }
+
+                    // Switch the page and the chart between the light and dark themes
+                    function toggleTheme() {
+                        var dark = document.body.classList.toggle("dark");
+                        document.getElementById("hljs-light").disabled = dark;
+                        document.getElementById("hljs-dark").disabled = !dark;
+                        
+                        var theme = chartThemes[dark ? "dark" : "light"];
+                        Plotly.relayout('plotly-chart', theme.layout);
+                        if (theme.bar_indices.length) {
+                            Plotly.restyle('plotly-chart', {'marker.color': theme.bar_colors}, theme.bar_indices);
+                        }
+                        Plotly.restyle('plotly-chart', {'line.color': theme.trend_line, 'marker.color': theme.trend_marker}, [theme.trend_index]);
+                    }
+
+                    // Tab handling functions
+                    document.addEventListener('DOMContentLoaded', function() {
+                        // First, hide all tab contents
+                        var tabcontents = document.getElementsByClassName("tabcontent");
+                        for (var i = 0; i < tabcontents.length; i++) {
+                            tabcontents[i].style.display = "none";
+                        }
+                        
+                        // Show the default tab
+                        document.getElementById("ErrorChart").style.display = "block";
+                        
+                        // Setup click handlers for tabs
+                        var tabs = document.getElementById("tabs").getElementsByTagName("button");
+                        for (var i = 0; i < tabs.length; i++) {
+                            tabs[i].addEventListener("click", function() {
+                                // Remove active class from all tabs
+                                for (var j = 0; j < tabs.length; j++) {
+                                    tabs[j].className = tabs[j].className.replace(" active", "");
+                                }
+                                
+                                // Add active class to clicked tab
+                                this.className += " active";
+                                
+                                // Hide all tab contents
+                                for (var j = 0; j < tabcontents.length; j++) {
+                                    tabcontents[j].style.display = "none";
+                                }
+                                
+                                // Show the corresponding tab content
+                                var tabId = this.id.replace("Tab", "");
+                                document.getElementById(tabId).style.display = "block";
+                            });
+                        }
+                        
+                        // Highlight the contract sources and the code blocks in prompts
+                        document.querySelectorAll('pre code.language-rust, .prompt-code-block code').forEach(function(block) {
+                            try {
+                                hljs.highlightElement(block);
+                            } catch (error) {
+                                console.log("Error highlighting code block:", error);
+                            }
+                        });
+                    });
+                </script>
+        """
+
+_CHART_FIGURE_END_TEMPLATE = Template(""";
+                    var chartThemes = $themes;
+                    Plotly.newPlot('plotly-chart', figure.data, figure.layout, {
+                        displayModeBar: true,
+                        responsive: true,
+                        displaylogo: false,
+                        toImageButtonOptions: {
+                            format: 'png',
+                            filename: 'error_chart$filename_suffix',
+                            height: 800,
+                            width: 1200,
+                            scale: 2
+                        }
+                    });
+                </script>
+            </div>
+        </body>
+        </html>
+        """)
+
+
 def generate_error_chart(iterations_data: List[dict], output_path: str, dark_mode: bool = False, all_contracts: List[str] = None, initial_prompt: str = None, iteration_prompts: List[str] = None) -> None:
     """
     Generate an interactive Plotly visualization of error codes by iteration.
@@ -574,32 +1472,28 @@ def generate_error_chart(iterations_data: List[dict], output_path: str, dark_mod
     # Sort iterations by number to ensure order
     iterations_data.sort(key=lambda x: x["iteration"])
     
+    # Pull the per-iteration fields out once; every loop below works on these
+    iteration_numbers = [iteration["iteration"] for iteration in iterations_data]
+    iteration_totals = [iteration["total_errors"] for iteration in iterations_data]
+    breakdowns = [iteration["error_breakdown"] for iteration in iterations_data]
+    
     # Get the list of all error codes across all iterations
     all_error_codes = set()
-    for iteration in iterations_data:
-        all_error_codes.update(iteration["error_breakdown"].keys())
+    for breakdown in breakdowns:
+        all_error_codes.update(breakdown.keys())
     all_error_codes = sorted(all_error_codes)
     
     # Create a mapping of error codes to their descriptions (from sample messages)
     error_descriptions = {}
-    for iteration in iterations_data:
-        for error_code, error_info in iteration["error_breakdown"].items():
+    for breakdown in breakdowns:
+        for error_code, error_info in breakdown.items():
             if error_code not in error_descriptions and isinstance(error_info, dict):
                 # Use the actual sample message from the compiler
                 message = error_info.get("message", "Unknown error")
                 level = error_info.get("level", "Error")
                 
                 # Prefix the description with the error level category
-                if "BlockingError" in level:
-                    prefix = "Error"
-                elif "NonblockingError" in level:
-                    prefix = "Non-blocking Error"
-                elif "Warning" in level:
-                    prefix = "Warning"
-                elif "Lint" in error_code:
-                    prefix = "Lint Warning"
-                else:
-                    prefix = level
+                prefix, _ = _classify_level(level, "Lint" in error_code)
                 
                 error_descriptions[error_code] = f"{prefix}: {message}"
     
@@ -621,9 +1515,9 @@ def generate_error_chart(iterations_data: List[dict], output_path: str, dark_mod
         error_category = None
         
         # Find the category for this error code
-        for iteration in iterations_data:
-            if error_code in iteration["error_breakdown"]:
-                error_info = iteration["error_breakdown"][error_code]
+        for breakdown in breakdowns:
+            if error_code in breakdown:
+                error_info = breakdown[error_code]
                 
                 # Get count
                 if isinstance(error_info, dict):
@@ -638,16 +1532,7 @@ def generate_error_chart(iterations_data: List[dict], output_path: str, dark_mod
                 
                 # Determine category if not already set
                 if error_category is None:
-                    if "BlockingError" in level:
-                        error_category = "Blocking Errors"
-                    elif "NonblockingError" in level:
-                        error_category = "Non-blocking Errors"
-                    elif "Warning" in level:
-                        error_category = "Warnings"
-                    elif "Lint" in error_code:
-                        error_category = "Lint Warnings"
-                    else:
-                        error_category = "Other"
+                    _, error_category = _classify_level(level, "Lint" in error_code)
         
         # Add to category totals
         if error_category:
@@ -674,23 +1559,6 @@ def generate_error_chart(iterations_data: List[dict], output_path: str, dark_mod
     # Get top 3 most frequent errors
     top_errors = sorted(error_frequency.items(), key=lambda x: x[1]["count"], reverse=True)[:3]
     
-    # Color gradients for each type - using HSL to ensure perceptual distinction
-    # For dark mode, we'll use slightly different hues and higher lightness
-    if dark_mode:
-        # Dark mode palettes (higher lightness for better visibility on dark backgrounds)
-        non_blocking_palette = [(0, 90, 60), (10, 85, 65)]  # Red hues (now for non-blocking)
-        error_palette = [(25, 90, 60), (35, 85, 65)]  # Orange hues (now for blocking errors)
-        warning_palette = [(40, 75, 60), (50, 70, 65)]  # Yellow hues
-        lint_palette = [(200, 75, 65), (220, 70, 70)]  # Blue hues
-        other_palette = [(290, 50, 65), (310, 50, 70)]  # Purple hues
-    else:
-        # Light mode palettes
-        non_blocking_palette = [(0, 90, 50), (10, 85, 55)]  # Red hues (now for non-blocking)
-        error_palette = [(25, 90, 50), (35, 85, 55)]  # Orange hues (now for blocking errors)
-        warning_palette = [(40, 75, 45), (50, 70, 50)]  # Yellow hues
-        lint_palette = [(200, 75, 55), (220, 70, 60)]  # Blue hues
-        other_palette = [(290, 50, 55), (310, 50, 60)]  # Purple hues
-    
     # Group error codes by type for color assignment
     error_types = {
         "Error": [],
@@ -713,129 +1581,102 @@ def generate_error_chart(iterations_data: List[dict], output_path: str, dark_mod
         else:
             error_types["Other"].append(error_code)
 
-    # Initialize dictionary to hold the color for each error code
-    error_colors = {}
-
-    # Assign colors based on gradients for each type
-    for type_name, codes in error_types.items():
-        if not codes:
-            continue
-            
-        if type_name == "Error":
-            palette = error_palette
-        elif type_name == "NonBlocking":
-            palette = non_blocking_palette
-        elif type_name == "Warning":
-            palette = warning_palette
-        elif type_name == "Lint":
-            palette = lint_palette
-        else:
-            palette = other_palette
-            
-        # Create gradient steps
-        num_codes = len(codes)
-        for i, code in enumerate(codes):
-            # Interpolate between palette start and end based on position
-            t = i / max(1, num_codes - 1)  # Avoid division by zero
-            h = palette[0][0] + t * (palette[1][0] - palette[0][0])
-            s = palette[0][1] + t * (palette[1][1] - palette[0][1])
-            l = palette[0][2] + t * (palette[1][2] - palette[0][2])
-            error_colors[code] = f"hsl({h}, {s}%, {l}%)"
+    # Assign colors based on gradients for each type, in both themes
+    error_colors = {mode: _error_colors(error_types, theme["palettes"]) for mode, theme in _CHART_THEMES.items()}
+    theme = _CHART_THEMES[dark_mode]
     
     # Prepare data for the stacked bar chart
     fig = go.Figure()
     
-    # Add traces, one for each error code
-    for error_code in all_error_codes:
-        y_values = []
-        for iteration in iterations_data:
-            error_info = iteration["error_breakdown"].get(error_code, 0)
+    # Per-iteration values shared by every trace
+    num_iterations = len(iterations_data)
+    x_labels = [f"Iteration {number}" for number in iteration_numbers]
+    error_totals = np.fromiter(iteration_totals, dtype=np.int64, count=num_iterations)
+    total_errors = error_totals.tolist()
+    
+    # Build dense per-code, per-iteration tables in a single pass over the breakdowns
+    counts = {code: [0] * num_iterations for code in all_error_codes}
+    messages = {code: ["Unknown error"] * num_iterations for code in all_error_codes}
+    levels = {code: ["Error"] * num_iterations for code in all_error_codes}
+    for i, breakdown in enumerate(breakdowns):
+        for error_code, error_info in breakdown.items():
             if isinstance(error_info, dict):
-                y_values.append(error_info["count"])
+                counts[error_code][i] = error_info["count"]
+                messages[error_code][i] = error_info.get("message", "Unknown error")
+                levels[error_code][i] = error_info.get("level", "Error")
             else:
-                y_values.append(error_info)  # For backward compatibility
+                counts[error_code][i] = error_info  # For backward compatibility
+    
+    # Build one bar trace per error code; they are added to the figure together
+    bars = []
+    bar_codes = []
+    for error_code in all_error_codes:
+        y_values = counts[error_code]
+        if not any(y_values):
+            continue  # Nothing to draw or hover over
+        code_messages = messages[error_code]
+        code_levels = levels[error_code]
         
-        # Add hover text with more information
+        # Add hover text with more information; empty segments get no tooltip
         hover_texts = []
         for i, count in enumerate(y_values):
             if count > 0:
                 # Get details for this particular error
-                error_info = iterations_data[i]["error_breakdown"].get(error_code)
-                message = error_info.get("message", "Unknown error") if isinstance(error_info, dict) else "Unknown error"
-                level = error_info.get("level", "Error") if isinstance(error_info, dict) else "Error"
+                message = code_messages[i]
+                level = code_levels[i]
                 
-                hover_texts.append(f"<b>Iteration {iterations_data[i]['iteration']}</b><br>"
-                                  f"Error code: <b>{error_code}</b><br>"
-                                  f"Level: <b>{level}</b><br>"
-                                  f"Message: <b>{message}</b><br>"
-                                  f"Count: <b>{count}</b><br>"
-                                  f"Percentage: <b>{(count/iterations_data[i]['total_errors'])*100:.1f}%</b>")
+                hover_texts.append(_HOVER_TEXT.format(
+                    label=x_labels[i],
+                    code=error_code,
+                    level=level,
+                    message=message,
+                    count=count,
+                    pct=(count/total_errors[i])*100,
+                ))
             else:
-                hover_texts.append(f"<b>Iteration {iterations_data[i]['iteration']}</b><br>"
-                                  f"Error code: <b>{error_code}</b><br>"
-                                  f"Count: <b>0</b>")
+                hover_texts.append("")
         
         # Use descriptive names in the legend instead of error codes
         legend_name = error_descriptions.get(error_code, error_code)
         
-        fig.add_trace(go.Bar(
+        bar_codes.append(error_code)
+        bars.append(go.Bar(
             name=legend_name,
-            x=[f"Iteration {i['iteration']}" for i in iterations_data],
+            x=x_labels,
             y=y_values,
-            marker_color=error_colors[error_code],
+            marker_color=error_colors[dark_mode][error_code],
             hovertemplate="%{text}<extra></extra>",
             text=hover_texts
         ))
+    fig.add_traces(bars)
     
     # Calculate progress statistics
-    first_iter = iterations_data[0]
-    last_iter = iterations_data[-1]
-    first_iter_errors = first_iter["total_errors"]
-    last_iter_errors = last_iter["total_errors"]
+    first_iter_errors = iteration_totals[0]
+    last_iter_errors = iteration_totals[-1]
     
     # Calculate percentage improvement
     improvement_pct = 0
     if first_iter_errors > 0:
         improvement_pct = ((first_iter_errors - last_iter_errors) / first_iter_errors) * 100
     
-    # Set background colors based on mode
-    if dark_mode:
-        bg_color = '#111827'  # Dark gray
-        text_color = '#F9FAFB'  # Light gray
-        grid_color = 'rgba(255, 255, 255, 0.1)'
-        template = 'plotly_dark'
-        stats_bg_color = 'rgba(31, 41, 55, 0.8)'  # Slightly lighter than background
-        stats_border_color = 'rgba(75, 85, 99, 0.5)'  # Gray border
-    else:
-        bg_color = 'white'
-        text_color = '#333'
-        grid_color = 'rgba(0, 0, 0, 0.1)'
-        template = 'plotly_white'
-        stats_bg_color = 'rgba(245, 247, 250, 0.85)'  # Light gray/blue
-        stats_border_color = 'rgba(200, 200, 200, 0.5)'  # Light gray border
+    text_color = theme["text"]
     
     # Add summary statistics box in the top right corner
     fig.add_annotation(
+        name="summary",
         xref="paper", yref="paper",
         x=0.99, y=0.99,
         xanchor="right", yanchor="top",
-        text=(
-            f"<b>Summary Statistics</b><br>"
-            f"Total Errors: {sum(c for c in error_categories.values())}<br>"
-            f"Blocking Errors: {error_categories['Blocking Errors']}<br>"
-            f"Non-blocking Errors: {error_categories['Non-blocking Errors']}<br>"
-            f"Warnings: {error_categories['Warnings']}<br>"
-            f"Lint Warnings: {error_categories['Lint Warnings']}<br>"
-            f"Overall Improvement: {improvement_pct:.1f}%<br>"
-            f"<b>Top Errors:</b><br>" + 
-            "<br>".join([f"{i+1}. {details['description']} ({details['count']})" 
-                         for i, (_, details) in enumerate(top_errors)])
+        text=_summary_text(
+            error_categories,
+            [(details["description"], details["count"]) for _, details in top_errors],
+            improvement_pct,
         ),
         showarrow=False,
-        bordercolor=stats_border_color,
+        bordercolor=theme["stats_border"],
         borderwidth=2,
         borderpad=10,
-        bgcolor=stats_bg_color,
+        bgcolor=theme["stats_bg"],
         opacity=0.9,
         font=dict(
             family="Arial, sans-serif",
@@ -852,22 +1693,22 @@ def generate_error_chart(iterations_data: List[dict], output_path: str, dark_mod
             'x': 0.5,
             'xanchor': 'center',
             'yanchor': 'top',
-            'font': {'size': 24, 'family': 'Arial, sans-serif', 'color': '#3B82F6' if dark_mode else '#1E3A8A'}
+            'font': {'size': 24, 'family': 'Arial, sans-serif', 'color': theme["title"]}
         },
         barmode='stack',
         xaxis_title={'text': 'Iteration', 'font': {'size': 16, 'family': 'Arial, sans-serif', 'color': text_color}},
         yaxis_title={'text': 'Number of Errors', 'font': {'size': 16, 'family': 'Arial, sans-serif', 'color': text_color}},
         legend_title={'text': 'Error Types', 'font': {'size': 14, 'family': 'Arial, sans-serif', 'color': text_color}},
-        template=template,
+        template=theme["template"],
         hovermode='closest',
         height=800,
         margin=dict(t=100, b=100, l=100, r=100),
-        paper_bgcolor=bg_color,
-        plot_bgcolor=bg_color,
+        paper_bgcolor=theme["bg"],
+        plot_bgcolor=theme["bg"],
         font={'family': 'Arial, sans-serif', 'color': text_color},
         legend={
-            'bgcolor': 'rgba(255, 255, 255, 0.1)' if dark_mode else 'rgba(255, 255, 255, 0.5)',
-            'bordercolor': 'rgba(255, 255, 255, 0.2)' if dark_mode else 'rgba(0, 0, 0, 0.1)',
+            'bgcolor': theme["legend_bg"],
+            'bordercolor': theme["legend_border"],
             'borderwidth': 1,
             'orientation': 'v',  # Vertical orientation for right side placement
             'yanchor': 'middle',
@@ -875,249 +1716,145 @@ def generate_error_chart(iterations_data: List[dict], output_path: str, dark_mod
             'xanchor': 'left',
             'x': 1.02  # Place just outside the right edge of the plot
         },
-        # Add a watermark-like subtitle
-        annotations=[
-            dict(
-                text="Sui Move Compiler Error Analysis",
-                xref="paper",
-                yref="paper",
-                x=0.5,
-                y=1.05,
-                showarrow=False,
-                font=dict(
-                    family="Arial, sans-serif",
-                    size=14,
-                    color='rgba(255, 255, 255, 0.4)' if dark_mode else 'rgba(0, 0, 0, 0.2)'
-                )
-            )
-        ]
     )
     
-    # Add a trend line showing the total errors per iteration
-    total_errors = [i["total_errors"] for i in iterations_data]
+    # Add a watermark-like subtitle
+    fig.add_annotation(**_watermark_annotation(theme))
     
+    # Add a trend line showing the total errors per iteration
     # Get successful iterations (where total_errors is 0)
-    successful_iterations = [i for i, errors in enumerate(total_errors) if errors == 0]
+    successful_iterations = np.flatnonzero(error_totals == 0).tolist()
     
     # Add the trend line
     fig.add_trace(go.Scatter(
-        x=[f"Iteration {i['iteration']}" for i in iterations_data],
+        x=x_labels,
         y=total_errors,
         mode='lines+markers',
         name='Total Errors',
-        line=dict(color='#EF4444' if dark_mode else 'red', width=3, dash='solid'),
-        marker=dict(size=10, symbol='diamond', color='#B91C1C' if dark_mode else 'darkred'),
+        line=dict(color=theme["trend_line"], width=3, dash='solid'),
+        marker=dict(size=10, symbol='diamond', color=theme["trend_marker"]),
         hovertemplate="<b>%{x}</b><br>Total Errors: <b>%{y}</b><extra></extra>"
     ))
     
     # Add markers for successful iterations
     if successful_iterations:
-        successful_x = [f"Iteration {iterations_data[i]['iteration']}" for i in successful_iterations]
-        successful_y = [0] * len(successful_iterations)
-        
-        fig.add_trace(go.Scatter(
-            x=successful_x,
-            y=successful_y,
-            mode='markers',
-            name='Success',
-            marker=dict(
-                symbol='star',
-                size=16,
-                color='#22C55E',  # Green
-                line=dict(width=2, color='#14532D')
-            ),
-            hovertemplate="<b>%{x}</b><br>Successfully compiled!<extra></extra>"
-        ))
-    
-    # Add annotations showing percentage improvement between iterations
-    for i in range(1, len(total_errors)):
-        if total_errors[i-1] > 0:  # Avoid division by zero
-            change_pct = ((total_errors[i] - total_errors[i-1]) / total_errors[i-1]) * 100
-            # Show both improvements and regressions with different colors
-            if change_pct < 0:
-                arrow_color = "#22C55E"  # Green for improvement
-                text_color = "#22C55E"
-            else:
-                arrow_color = "#EF4444"  # Red for regression
-                text_color = "#EF4444"
-                
-            fig.add_annotation(
-                x=i,
-                y=(total_errors[i] + total_errors[i-1]) / 2,
-                text=f"{change_pct:.1f}%",
-                showarrow=True,
-                arrowhead=2,
-                arrowsize=1,
-                arrowwidth=2,
-                arrowcolor=arrow_color,
-                font=dict(size=12, color=text_color),
-                ax=40,
-                ay=0
-            )
-    
-    # Add grid lines
-    fig.update_xaxes(
-        showgrid=True,
-        gridwidth=1,
-        gridcolor=grid_color,
-        tickangle=0
-    )
-    fig.update_yaxes(
-        showgrid=True,
-        gridwidth=1,
-        gridcolor=grid_color
-    )
-    
-    # Add labels showing exact error counts above each bar
-    for i, _ in enumerate(iterations_data):
-        if total_errors[i] > 0:
-            fig.add_annotation(
-                x=i,
-                y=total_errors[i] + 1,  # Position slightly above the bar
-                text=str(total_errors[i]),
-                showarrow=False,
-                font=dict(
-                    size=14, 
-                    color='#F9FAFB' if dark_mode else '#111827'
-                )
-            )
-            
-    # Save the figure as an HTML file with embedded contract code
-    html_path = f"{output_path}_error_chart{'_dark' if dark_mode else ''}.html"
-    
-    # If we have contract source code, create an HTML file with tabs
-    if all_contracts and len(all_contracts) > 0:
-        # Create HTML with tabs for the chart and each iteration's source code
-        html_content = f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Sui Move Contract Analysis</title>
-            <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
-            <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/styles/{'atom-one-dark.min.css' if dark_mode else 'github.min.css'}">
-            <script src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/highlight.min.js"></script>
-            <script src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/languages/rust.min.js"></script>
-            <script src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/languages/bash.min.js"></script>
-            <script src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/languages/toml.min.js"></script>
-            <script src="https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/languages/markdown.min.js"></script>
-            <style>
-                body {{
-                    font-family: Arial, sans-serif;
-                    margin: 0;
-                    padding: 0;
-                    background-color: {bg_color};
-                    color: {text_color};
-                }}
-                .container {{
-                    width: 95%;
-                    margin: 20px auto;
-                    min-height: 85vh; /* Ensure container takes up most of the viewport height */
-                }}
-                .tab {{
-                    overflow: hidden;
-                    border: 1px solid {'#2D3748' if dark_mode else '#ccc'};
-                    background-color: {'#1F2937' if dark_mode else '#f1f1f1'};
-                    border-radius: 5px 5px 0 0;
-                }}
-                .tab button {{
-                    background-color: inherit;
-                    float: left;
-                    border: none;
-                    outline: none;
-                    cursor: pointer;
-                    padding: 14px 16px;
-                    transition: 0.3s;
-                    font-size: 16px;
-                    color: {text_color};
-                }}
-                .tab button:hover {{
-                    background-color: {'#374151' if dark_mode else '#ddd'};
-                }}
-                .tab button.active {{
-                    background-color: {'#4B5563' if dark_mode else '#ccc'};
-                }}
-                .tabcontent {{
-                    display: none;
-                    padding: 6px 12px;
-                    border: 1px solid {'#2D3748' if dark_mode else '#ccc'};
-                    border-top: none;
-                    border-radius: 0 0 5px 5px;
-                    animation: fadeEffect 1s;
-                    background-color: {'#1F2937' if dark_mode else '#fff'};
-                    min-height: 70vh; /* Ensure tab content area is tall enough */
-                }}
-                @keyframes fadeEffect {{
-                    from {{opacity: 0;}}
-                    to {{opacity: 1;}}
-                }}
-                pre {{
-                    margin: 0;
-                    padding: 16px;
-                    overflow: auto;
-                    border-radius: 4px;
-                }}
-                code {{
-                    font-family: 'Courier New', Courier, monospace;
-                }}
-                .hljs-line-numbers {{
-                    text-align: right;
-                    padding-right: 10px;
-                    color: {'#6B7280' if dark_mode else '#999'};
-                    border-right: 1px solid {'#4B5563' if dark_mode else '#ddd'};
-                    margin-right: 10px;
-                    user-select: none;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1 style="text-align: center; color: {'#3B82F6' if dark_mode else '#1E3A8A'};">Sui Move Contract Analysis</h1>
-                
-                <div class="tab" id="tabs">
-                    <button class="tablinks active" id="ErrorChartTab">Error Chart</button>
-        """
+        successful_x = [x_labels[i] for i in successful_iterations]
+        successful_y = [0] * len(successful_iterations)
         
-        # Add buttons for each iteration
-        for i, contract in enumerate(all_contracts):
-            if contract:  # Only add tabs for non-empty contracts
-                html_content += f"""
+        fig.add_trace(go.Scatter(
+            x=successful_x,
+            y=successful_y,
+            mode='markers',
+            name='Success',
+            marker=dict(
+                symbol='star',
+                size=16,
+                color='#22C55E',  # Green
+                line=dict(width=2, color='#14532D')
+            ),
+            hovertemplate="<b>%{x}</b><br>Successfully compiled!<extra></extra>"
+        ))
+    
+    # Annotations are collected here and added to the layout in a single update
+    annotations = []
+    
+    # Add annotations showing percentage improvement between iterations.
+    # The changes and midpoints are computed for all steps at once; steps that
+    # start from zero errors are skipped to avoid dividing by zero.
+    previous, current = error_totals[:-1], error_totals[1:]
+    steps = np.flatnonzero(previous > 0)
+    change_pcts = ((current[steps] - previous[steps]) / previous[steps] * 100).tolist()
+    midpoints = ((current[steps] + previous[steps]) / 2).tolist()
+    for step, change_pct, midpoint in zip(steps.tolist(), change_pcts, midpoints):
+        # Show both improvements and regressions with different colors
+        if change_pct < 0:
+            arrow_color = "#22C55E"  # Green for improvement
+            text_color = "#22C55E"
+        else:
+            arrow_color = "#EF4444"  # Red for regression
+            text_color = "#EF4444"
+            
+        annotations.append(dict(
+            x=step + 1,
+            y=midpoint,
+            text=f"{change_pct:.1f}%",
+            showarrow=True,
+            arrowhead=2,
+            arrowsize=1,
+            arrowwidth=2,
+            arrowcolor=arrow_color,
+            font=dict(size=12, color=text_color),
+            ax=40,
+            ay=0
+        ))
+    
+    # Add grid lines
+    fig.update_xaxes(
+        showgrid=True,
+        gridwidth=1,
+        gridcolor=theme["grid"],
+        tickangle=0
+    )
+    fig.update_yaxes(
+        showgrid=True,
+        gridwidth=1,
+        gridcolor=theme["grid"]
+    )
+    
+    # Add labels showing exact error counts above each bar
+    fig.update_layout(annotations=list(fig.layout.annotations) + annotations + _count_annotations(total_errors, theme))
+            
+    # Save the figure as an HTML file with embedded contract code
+    html_path = f"{output_path}_error_chart{'_dark' if dark_mode else ''}.html"
+    
+    # If we have contract source code, create an HTML file with tabs
+    if all_contracts and len(all_contracts) > 0:
+        # Create HTML with tabs for the chart and each iteration's source code.
+        # The document is collected in a list of fragments and written out in one go.
+        # Both themes are in the page; dark_mode only picks the one it opens with.
+        html_parts = [_CHART_HEAD_TEMPLATE.substitute(
+            body_class=' class="dark"' if dark_mode else '',
+            light_disabled=' disabled' if dark_mode else '',
+            dark_disabled='' if dark_mode else ' disabled',
+        )]
+        
+        # Add buttons for each iteration, only for non-empty contracts
+        html_parts.append("".join(
+            f"""
                     <button class="tablinks" id="Iteration{i+1}Tab">Iteration {i+1}</button>
                 """
+            for i, contract in enumerate(all_contracts)
+            if contract
+        ))
         
-        html_content += """
+        html_parts.append("""
                 </div>
                 
                 <div id="ErrorChart" class="tabcontent" style="display: block;">
                     <div id="plotly-chart"></div>
-        """
+        """)
         
         # Add initial prompt console card if available
         if initial_prompt:
-            console_bg_color = "#1E293B" if dark_mode else "#F1F5F9"
-            console_text_color = "#E2E8F0" if dark_mode else "#334155"
-            console_border = "#475569" if dark_mode else "#CBD5E1"
-            
-            html_content += f"""
+            html_parts.append(f"""
                     <div class="prompt-console" style="margin-top: 30px; margin-bottom: 20px; border-radius: 8px; overflow: hidden; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);">
-                        <div class="console-header" style="background-color: {console_bg_color}; padding: 10px 15px; border-bottom: 1px solid {console_border};">
+                        <div class="console-header" style="padding: 10px 15px;">
                             <div style="display: flex; align-items: center;">
                                 <div style="width: 12px; height: 12px; border-radius: 50%; background-color: #EF4444; margin-right: 8px;"></div>
                                 <div style="width: 12px; height: 12px; border-radius: 50%; background-color: #F59E0B; margin-right: 8px;"></div>
                                 <div style="width: 12px; height: 12px; border-radius: 50%; background-color: #10B981; margin-right: 8px;"></div>
-                                <span style="color: {console_text_color}; font-family: 'Arial', sans-serif; font-size: 14px;">Initial Prompt</span>
+                                <span class="console-title" style="font-family: 'Arial', sans-serif; font-size: 14px;">Initial Prompt</span>
                             </div>
                         </div>
-                        <div class="console-body" style="background-color: {console_bg_color}; padding: 15px; max-height: 350px; overflow-y: auto;">
-                            <pre style="margin: 0; white-space: pre-wrap; color: {console_text_color}; font-family: 'Courier New', monospace; font-size: 14px;">{escape_html(initial_prompt)}</pre>
+                        <div class="console-body" style="padding: 15px; max-height: 350px; overflow-y: auto;">
+                            <pre style="margin: 0; white-space: pre-wrap; font-family: 'Courier New', monospace; font-size: 14px;">{render_prompt(initial_prompt)}</pre>
                         </div>
                     </div>
-            """
+            """)
         
-        html_content += """
+        html_parts.append("""
                 </div>
-        """
+        """)
         
         # Add content for each iteration
         for i, contract in enumerate(all_contracts):
@@ -1127,216 +1864,111 @@ def generate_error_chart(iterations_data: List[dict], output_path: str, dark_mod
                 if iteration_prompts and i < len(iteration_prompts):
                     iteration_prompt = iteration_prompts[i]
                 
-                html_content += f"""
+                html_parts.append(f"""
                 <div id="Iteration{i+1}" class="tabcontent">
                     <h3>Contract Source - Iteration {i+1}</h3>
-                """
+                """)
                 
                 # Add the prompt for this iteration if available
                 if iteration_prompt:
-                    console_bg_color = "#1E293B" if dark_mode else "#F1F5F9"
-                    console_text_color = "#E2E8F0" if dark_mode else "#334155"
-                    console_border = "#475569" if dark_mode else "#CBD5E1"
-                    
-                    html_content += f"""
+                    html_parts.append(f"""
                     <div class="iteration-prompt" style="margin-bottom: 20px;">
                         <h4>Prompt for Iteration {i+1}</h4>
                         <div class="prompt-console" style="border-radius: 8px; overflow: hidden; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);">
-                            <div class="console-header" style="background-color: {console_bg_color}; padding: 8px 12px; border-bottom: 1px solid {console_border};">
+                            <div class="console-header" style="padding: 8px 12px;">
                                 <div style="display: flex; align-items: center;">
                                     <div style="width: 10px; height: 10px; border-radius: 50%; background-color: #EF4444; margin-right: 6px;"></div>
                                     <div style="width: 10px; height: 10px; border-radius: 50%; background-color: #F59E0B; margin-right: 6px;"></div>
                                     <div style="width: 10px; height: 10px; border-radius: 50%; background-color: #10B981; margin-right: 6px;"></div>
-                                    <span style="color: {console_text_color}; font-family: 'Arial', sans-serif; font-size: 12px;">Prompt</span>
+                                    <span class="console-title" style="font-family: 'Arial', sans-serif; font-size: 12px;">Prompt</span>
                                 </div>
                             </div>
-                            <div class="console-body" style="background-color: {console_bg_color}; padding: 12px; max-height: 200px; overflow-y: auto;">
-                                <pre style="margin: 0; white-space: pre-wrap; color: {console_text_color}; font-family: 'Courier New', monospace; font-size: 12px;">{escape_html(iteration_prompt)}</pre>
+                            <div class="console-body" style="padding: 12px; max-height: 200px; overflow-y: auto;">
+                                <pre style="margin: 0; white-space: pre-wrap; font-family: 'Courier New', monospace; font-size: 12px;">{render_prompt(iteration_prompt)}</pre>
                             </div>
                         </div>
                     </div>
-                    """
+                    """)
                 
-                # Add syntax highlighting with line numbers for the contract code
-                html_content += f"""
-                    <pre><code class="language-rust hljs">{escape_html(contract)}</code></pre>
+                # Add syntax highlighting with line numbers for the contract code.
+                # The numbers go in a gutter next to the code block, because
+                # highlight.js replaces any markup inside the block it highlights.
+                line_numbers = "\n".join(map(str, range(1, contract.count("\n") + 2)))
+                html_parts.append(f"""
+                    <div class="code-with-lines">
+                        <pre class="hljs-line-numbers">{line_numbers}</pre>
+                        <pre><code class="language-rust hljs">{escape_html(contract)}</code></pre>
+                    </div>
                 </div>
-                """
+                """)
         
         # Add JavaScript for the tabs and syntax highlighting
-        html_content += """
-                <script>
-                    // Legacy function for backward compatibility
-                    function openTab(evt, tabName) {
-                        var i, tabcontent, tablinks;
-                        tabcontent = document.getElementsByClassName("tabcontent");
-                        for (i = 0; i < tabcontent.length; i++) {
-                            tabcontent[i].style.display = "none";
-                        }
-                        tablinks = document.getElementsByClassName("tablinks");
-                        for (i = 0; i < tablinks.length; i++) {
-                            tablinks[i].className = tablinks[i].className.replace(" active", "");
-                        }
-                        document.getElementById(tabName).style.display = "block";
-                        evt.currentTarget.className += " active";
-                    }
-
-                    // Tab handling functions
-                    document.addEventListener('DOMContentLoaded', function() {
-                        // First, hide all tab contents
-                        var tabcontents = document.getElementsByClassName("tabcontent");
-                        for (var i = 0; i < tabcontents.length; i++) {
-                            tabcontents[i].style.display = "none";
-                        }
-                        
-                        // Show the default tab
-                        document.getElementById("ErrorChart").style.display = "block";
-                        
-                        // Setup click handlers for tabs
-                        var tabs = document.getElementById("tabs").getElementsByTagName("button");
-                        for (var i = 0; i < tabs.length; i++) {
-                            tabs[i].addEventListener("click", function() {
-                                // Remove active class from all tabs
-                                for (var j = 0; j < tabs.length; j++) {
-                                    tabs[j].className = tabs[j].className.replace(" active", "");
-                                }
-                                
-                                // Add active class to clicked tab
-                                this.className += " active";
-                                
-                                // Hide all tab contents
-                                for (var j = 0; j < tabcontents.length; j++) {
-                                    tabcontents[j].style.display = "none";
-                                }
-                                
-                                // Show the corresponding tab content
-                                var tabId = this.id.replace("Tab", "");
-                                document.getElementById(tabId).style.display = "block";
-                            });
-                        }
-                    });
-                    
-                    // Add line numbers to code blocks
-                    function addLineNumbers() {
-                        var codeBlocks = document.querySelectorAll('pre code');
-                        codeBlocks.forEach(function(codeBlock) {
-                            var lines = codeBlock.innerHTML.split('\\n');
-                            var numbered = lines.map(function(line, i) {
-                                return '<span class="hljs-line-numbers">' + (i + 1) + '</span>' + line;
-                            }).join('\\n');
-                            codeBlock.innerHTML = numbered;
-                        });
-                    }
-                    
-                    document.addEventListener('DOMContentLoaded', function() {
-                        // Initialize syntax highlighting
-                        hljs.highlightAll();
-                        // Add line numbers after highlighting
-                        addLineNumbers();
-                        
-                        // Process code blocks in prompts
-                        processPromptCodeBlocks();
-                    });
-                    
-                    // Function to process code blocks in prompts
-                    function processPromptCodeBlocks() {
-                        // Find all prompt pre elements
-                        const promptPres = document.querySelectorAll('.console-body pre');
-                        
-                        promptPres.forEach(function(pre) {
-                            try {
-                                // Use a safer string-based approach instead of regex
-                                let content = pre.innerHTML;
-                                let processed = content;
-                                
-                                // Find the start positions of all code blocks
-                                const codeBlockStarts = [];
-                                let searchPos = 0;
-                                let foundPos;
-                                
-                                while ((foundPos = content.indexOf("```", searchPos)) !== -1) {
-                                    codeBlockStarts.push(foundPos);
-                                    searchPos = foundPos + 3;
-                                }
-                                
-                                // Process code blocks in reverse order to avoid position shifts
-                                if (codeBlockStarts.length >= 2 && codeBlockStarts.length % 2 === 0) {
-                                    for (let i = codeBlockStarts.length - 2; i >= 0; i -= 2) {
-                                        const blockStart = codeBlockStarts[i];
-                                        const blockEnd = codeBlockStarts[i + 1];
-                                        
-                                        // Extract the entire block including markers
-                                        const fullBlock = content.substring(blockStart, blockEnd + 3);
-                                        
-                                        // Extract language (if any)
-                                        let lang = 'plaintext';
-                                        const firstLineEnd = fullBlock.indexOf('');
-                                        if (firstLineEnd > 3) { // There's content after the opening ```
-                                            lang = fullBlock.substring(3, firstLineEnd).trim() || 'plaintext';
-                                        }
-                                        
-                                        // Extract code content (between the markers)
-                                        const codeStart = fullBlock.indexOf('') + 1;
-                                        const codeEnd = fullBlock.lastIndexOf("```");
-                                        const code = fullBlock.substring(codeStart, codeEnd);
-                                        
-                                        // Create the replacement HTML
-                                        const replacement = `<div class="prompt-code-block" style="margin: 10px 0; border-radius: 4px; overflow: hidden;">
-                                          <div style="padding: 6px 10px; background-color: rgba(0,0,0,0.2); font-size: 12px; border-bottom: 1px solid rgba(0,0,0,0.1);">${lang}</div>
-                                          <pre style="margin: 0; padding: 10px;"><code class="language-${lang}">${code}</code></pre>
-                                        </div>`;
-                                        
-                                        // Replace the code block with the HTML
-                                        processed = processed.replace(fullBlock, replacement);
-                                    }
-                                }
-                                
-                                if (content !== processed) {
-                                    pre.innerHTML = processed;
-                                    // Apply highlighting to the newly created code blocks
-                                    pre.querySelectorAll('code').forEach(function(block) {
-                                        hljs.highlightElement(block);
-                                    });
-                                }
-                            } catch (error) {
-                                console.log("Error processing code blocks:", error);
-                            }
-                        });
-                    }
-                </script>
-        """
+        html_parts.append(_CHART_SCRIPT)
         
-        # Add the Plotly figure
-        fig_json = fig.to_json()
-        html_content += f"""
+        # Add the Plotly figure. Its JSON (from plotly's own encoder, which uses orjson
+        # when it is installed) is written out as its own fragment rather than
+        # being interpolated into the page.
+        html_parts.append("""
                 <script>
-                    var figure = {fig_json};
-                    Plotly.newPlot('plotly-chart', figure.data, figure.layout, {{
-                        displayModeBar: true,
-                        responsive: true,
-                        displaylogo: false,
-                        toImageButtonOptions: {{
-                            format: 'png',
-                            filename: 'error_chart{"_dark" if dark_mode else ""}',
-                            height: 800,
-                            width: 1200,
-                            scale: 2
-                        }}
-                    }});
-                </script>
-            </div>
-        </body>
-        </html>
-        """
+                    var figure = """)
+        # What the theme toggle changes in the figure, for each theme. The
+        # annotations are the figure's own, recoloured by name: the summary box,
+        # the watermark and the count labels follow the theme, and the
+        # percentage arrows keep their colours.
+        figure_annotations = [annotation.to_plotly_json() for annotation in fig.layout.annotations]
+        themes = {}
+        for mode, mode_theme in _CHART_THEMES.items():
+            mode_annotations = [dict(annotation, font=dict(annotation["font"])) for annotation in figure_annotations]
+            for annotation in mode_annotations:
+                name = annotation.get("name")
+                if name == "summary":
+                    annotation.update(bgcolor=mode_theme["stats_bg"], bordercolor=mode_theme["stats_border"])
+                    annotation["font"]["color"] = mode_theme["text"]
+                elif name == "watermark":
+                    annotation["font"]["color"] = mode_theme["watermark"]
+                elif name == "count_label":
+                    annotation["font"]["color"] = mode_theme["count_label"]
+
+            themes["dark" if mode else "light"] = {
+                "layout": {
+                    "template": pio.templates[mode_theme["template"]],
+                    "paper_bgcolor": mode_theme["bg"],
+                    "plot_bgcolor": mode_theme["bg"],
+                    "font.color": mode_theme["text"],
+                    "title.font.color": mode_theme["title"],
+                    "xaxis.title.font.color": mode_theme["text"],
+                    "yaxis.title.font.color": mode_theme["text"],
+                    "legend.title.font.color": mode_theme["text"],
+                    "legend.bgcolor": mode_theme["legend_bg"],
+                    "legend.bordercolor": mode_theme["legend_border"],
+                    "xaxis.gridcolor": mode_theme["grid"],
+                    "yaxis.gridcolor": mode_theme["grid"],
+                    "annotations": mode_annotations,
+                },
+                "bar_colors": [error_colors[mode][code] for code in bar_codes],
+                "bar_indices": list(range(len(bar_codes))),
+                "trend_line": mode_theme["trend_line"],
+                "trend_marker": mode_theme["trend_marker"],
+                "trend_index": len(bar_codes),
+            }
+        figure_script_end = _CHART_FIGURE_END_TEMPLATE.substitute(
+            themes=pio.json.to_json_plotly(themes),
+            filename_suffix="_dark" if dark_mode else "",
+        )
         
-        # Write the HTML to file
-        with open(html_path, "w") as f:
-            f.write(html_content)
+        # The page loads plotly.js from a copy next to it, shared by every chart in
+        # the directory, rather than from the CDN
+        _ensure_plotlyjs(os.path.dirname(html_path))
+        
+        # Write the HTML to file as UTF-8, replacing any previous chart in one step
+        html_parts.append(fig.to_json())
+        html_parts.append(figure_script_end)
+        _write_atomic(html_path, (part.encode("utf-8") for part in html_parts))
     else:
         # If we don't have contract source code, save just the figure
         fig.write_html(
             html_path,
-            include_plotlyjs='cdn',
+            include_plotlyjs='directory',
             full_html=True,
             config={
                 'displayModeBar': True,
@@ -1359,16 +1991,73 @@ def generate_error_chart(iterations_data: List[dict], output_path: str, dark_mod
     return fig
 
 
+# HTML special characters and their entities, applied in a single str.translate pass
+_HTML_ESCAPES = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&#039;",
+})
+
+
 def escape_html(text):
-    """Escape HTML special characters in text."""
-    return (text.replace("&", "&amp;")
-                .replace("<", "&lt;")
-                .replace(">", "&gt;")
-                .replace('"', "&quot;")
-                .replace("'", "&#039;"))
+    """
+    Escape HTML special characters in text, in a single str.translate pass.
+    """
+    return text.translate(_HTML_ESCAPES)
+
+
+@functools.lru_cache(maxsize=128)
+def render_prompt(text: str) -> str:
+    """
+    Render a prompt as HTML for the chart page.
+
+    The text is escaped, except that fenced code blocks become highlighted code
+    blocks labelled with their language ("plaintext" when none is given).
+
+    Args:
+        text: The prompt text
+
+    Returns:
+        The HTML to place inside the prompt's <pre> element
+    """
+    parts = []
+    position = 0
+    for match in _FENCE_RE.finditer(text):
+        lang = match.group(1) or "plaintext"
+        parts.append(escape_html(text[position:match.start()]))
+        parts.append(
+            f'<div class="prompt-code-block" style="margin: 10px 0; border-radius: 4px; overflow: hidden;">'
+            f'<div style="padding: 6px 10px; background-color: rgba(0,0,0,0.2); font-size: 12px; border-bottom: 1px solid rgba(0,0,0,0.1);">{lang}</div>'
+            f'<pre style="margin: 0; padding: 10px;"><code class="language-{lang}">{escape_html(match.group(2))}</code></pre>'
+            f'</div>'
+        )
+        position = match.end()
+    parts.append(escape_html(text[position:]))
+    return "".join(parts)
+
+
+def _json_bytes(obj) -> bytes:
+    """
+    Serialize an object to compact UTF-8 JSON, using orjson when it is installed.
+
+    Args:
+        obj: The object to serialize
+
+    Returns:
+        The encoded JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
 
+# System message of every fine-tuning example: the model plays the compiler
+_COMPILER_SYSTEM_MESSAGE = {"role": "system", "content": "You are a Sui Move compiler. Your task is to analyze the provided contract and output any compilation errors."}
 
-def save_fine_tuning_data(fine_tuning_data: list, output_path: str, dark_mode: bool = False):
+
+def save_fine_tuning_data(fine_tuning_data: list, output_path: str, dark_mode: bool = False, write_reference_json: bool = True):
     """
     Save fine-tuning data to a file in a format suitable for model training.
     
@@ -1376,6 +2065,8 @@ def save_fine_tuning_data(fine_tuning_data: list, output_path: str, dark_mode: b
         fine_tuning_data: List of iteration data
         output_path: Base path to save the file (without extension)
         dark_mode: Whether to use dark mode for visualizations
+        write_reference_json: Also save the full dataset as compact JSON; only the
+            JSONL file is needed for fine-tuning
     """
     # Format the data for fine-tuning
     training_examples = []
@@ -1395,99 +2086,144 @@ def save_fine_tuning_data(fine_tuning_data: list, output_path: str, dark_mode: b
         # Remove the histogram data from the list
         fine_tuning_data = fine_tuning_data[:-1]
     
-    # Extract each version of the contract and prompts for visualization
-    for i, iteration in enumerate(fine_tuning_data):
-        if "contract_source" in iteration:
-            contract_versions.append(iteration["contract_source"])
-        else:
-            # If this iteration doesn't have contract source, add None as placeholder
-            contract_versions.append(None)
+    # One pass collects the contract versions and prompts for the visualization and
+    # the training examples, writing each example to the JSONL file for fine-tuning
+    # as it goes, so the encoded lines are never all held in memory at once.
+    # Each line has one messages array containing the system, user, and assistant messages.
+    jsonl_path = f"{output_path}.jsonl"
+    # Distinct contract sources; dataset examples refer to them by index
+    sources = []
+    source_ids = {}
+    add_contract_version = contract_versions.append
+    add_iteration_prompt = iteration_prompts.append
+    add_training_example = training_examples.append
+    with _open_atomic(jsonl_path) as jsonl_file:
+        write_jsonl_line = jsonl_file.write
+        for i, iteration in enumerate(fine_tuning_data):
+            # Iterations without contract source or prompt get None as placeholder
+            contract_source = iteration.get("contract_source")
+            prompt = iteration.get("prompt")
+            add_contract_version(contract_source)
+            add_iteration_prompt(prompt)
             
-        # Extract prompts for each iteration
-        if "prompt" in iteration:
-            iteration_prompts.append(iteration["prompt"])
             # Store the initial prompt separately
             if i == 0:
-                initial_prompt = iteration["prompt"]
-        else:
-            iteration_prompts.append(None)
-        
-        if not iteration["is_successful"]:
-            # For unsuccessful iterations, we create a training example
-            # Input: the buggy contract, Output: the compiler errors
-            training_example = {
-                "input": iteration["contract_source"],
-                "output": iteration["compiler_output"],
-                "metadata": {
-                    "iteration": iteration["iteration"],
-                    "timestamp": iteration["timestamp"],
-                    "error_stats": iteration["error_stats"],
-                    "error_codes": iteration.get("error_codes", {})
-                }
-            }
-            training_examples.append(training_example)
+                initial_prompt = prompt
+            
+            if not iteration["is_successful"]:
+                # For unsuccessful iterations, we create a training example
+                # Input: the buggy contract (by source id), Output: the compiler errors
+                compiler_output = iteration["compiler_output"]
+                source_id = source_ids.get(contract_source)
+                if source_id is None:
+                    source_id = source_ids[contract_source] = len(sources)
+                    sources.append(contract_source)
+                add_training_example({
+                    "source_id": source_id,
+                    "output": compiler_output,
+                    "metadata": {
+                        "iteration": iteration["iteration"],
+                        "timestamp": iteration["timestamp"],
+                        "error_stats": iteration["error_stats"],
+                        "error_codes": iteration.get("error_codes", {})
+                    }
+                })
+                write_jsonl_line(_json_bytes({"messages": (
+                    _COMPILER_SYSTEM_MESSAGE,
+                    {"role": "user", "content": contract_source},
+                    {"role": "assistant", "content": compiler_output}
+                )}) + b"\n")
     
-    # Format the full dataset with metadata
+    # Format the full dataset with metadata. Each contract source is stored once in
+    # "sources"; examples give its index as "source_id" instead of inlining it
+    # (the JSONL file written above keeps the inlined form that fine-tuning consumes).
     dataset = {
-        "version": "1.0",
+        "version": "2.0",
         "created_at": datetime.datetime.now().isoformat(),
         "description": "Sui Move compiler error prediction dataset",
+        "sources": sources,
         "examples": training_examples,
         "error_histogram": error_histogram,
         "iterations_data": iterations_data,  # Add data formatted for stacked bar chart
         "total_iterations": total_iterations
     }
     
-    # Save to JSONL for fine-tuning - correct format with one messages array per entry
-    system_message = "You are a Sui Move compiler. Your task is to analyze the provided contract and output any compilation errors."
-    jsonl_path = f"{output_path}.jsonl"
-    with open(jsonl_path, "w") as f:
-        for example in training_examples:
-            # Each line has one messages array containing the system, user, and assistant messages
-            messages = [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": example["input"]},
-                {"role": "assistant", "content": example["output"]}
-            ]
-            f.write(json.dumps({"messages": messages}) + "\n")
-    
     # Also save the full dataset to JSON for reference
     json_path = f"{output_path}.json"
-    with open(json_path, "w") as f:
-        json.dump(dataset, f, indent=2)
+    if write_reference_json:
+        _write_atomic(json_path, (_json_bytes(dataset),))
     
     # Generate the error chart visualization
     if iterations_data:
         try:
+            # The chart page carries both themes and a toggle, so one file is enough
             generate_error_chart(iterations_data, output_path, dark_mode, contract_versions, initial_prompt=initial_prompt, iteration_prompts=iteration_prompts)
-            
-            # Generate the alternate theme version if requested
-            if not dark_mode:
-                alt_path = f"{output_path}_error_chart_dark.html"
-                if not os.path.exists(alt_path):
-                    generate_error_chart(iterations_data, output_path, True, contract_versions, initial_prompt=initial_prompt, iteration_prompts=iteration_prompts)
-                    console.print(f"[bold green]Dark mode visualization also available at:[/bold green] {alt_path}")
-            else:
-                alt_path = f"{output_path}_error_chart.html"
-                if not os.path.exists(alt_path):
-                    generate_error_chart(iterations_data, output_path, False, contract_versions, initial_prompt=initial_prompt, iteration_prompts=iteration_prompts)
-                    console.print(f"[bold green]Light mode visualization also available at:[/bold green] {alt_path}")
                 
         except Exception as e:
             console.print(f"[yellow]Warning: Could not generate error chart: {e}. Make sure plotly is installed.[/yellow]")
     
     console.print(f"[bold green]Fine-tuning data saved to:[/bold green] {jsonl_path}")
-    console.print(f"[bold green]Complete dataset saved to:[/bold green] {json_path}")
+    if write_reference_json:
+        console.print(f"[bold green]Complete dataset saved to:[/bold green] {json_path}")
 
 
-def main():
+@dataclass
+class OutputPaths:
     """
-    Main entry point for the application.
+    Where the files of a run are saved.
     """
-    parser = argparse.ArgumentParser(
-        description="Neuromansui: LLM-powered Sui Move contract generator and refiner",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
+    output_dir: str
+    contract_name: str
+    contract_path: str
+    iterations_path: str  # Base path; the data and chart files add their own suffixes
+    test_path: str
+
+
+def resolve_output_paths(args: argparse.Namespace) -> OutputPaths:
+    """
+    Work out the output paths of a run from the command-line arguments and create
+    the output directory.
+
+    Files go under --save-dir, named after --name or, without one, after the prompt
+    and the current time. The deprecated --output, --iterations-output and
+    --test-output paths take precedence where given.
+
+    Args:
+        args: The parsed command-line arguments
+
+    Returns:
+        The output paths of the run
+    """
+    if args.output:
+        # Legacy output path
+        contract_path = args.output
+        output_dir = os.path.dirname(os.path.abspath(contract_path))
+        contract_name = os.path.splitext(os.path.basename(contract_path))[0]
+    else:
+        output_dir = args.save_dir
+        if args.name:
+            contract_name = args.name
+        else:
+            # Create a name based on prompt and timestamp
+            prompt_part = args.prompt.split('.')[-1]  # Take the last part of the prompt path
+            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+            contract_name = f"{prompt_part}_{timestamp}"
+        contract_path = os.path.join(output_dir, f"{contract_name}.move")
+    
+    # Ensure the directory exists
+    os.makedirs(output_dir, exist_ok=True)
+    
+    return OutputPaths(
+        output_dir=output_dir,
+        contract_name=contract_name,
+        contract_path=contract_path,
+        iterations_path=args.iterations_output or os.path.join(output_dir, f"{contract_name}_iterations"),
+        test_path=args.test_output or os.path.join(output_dir, f"{contract_name}_test.move"),
+    )
+
+
+# Usage examples shown at the end of --help
+_CLI_EPILOG = """
 Examples:
   # List available prompts
   python -m neuromansui.main --list
@@ -1501,11 +2237,44 @@ Examples:
   # Generate a contract with tests and visualizations
   python -m neuromansui.main --prompt sui_move.defi_contract --generate-tests --save-iterations --dark-mode
         """
+
+
+def _positive_int(value: str) -> int:
+    """
+    Parse a command-line value as an integer of at least 1.
+
+    Args:
+        value: The argument as given on the command line
+
+    Returns:
+        The parsed integer
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+@functools.lru_cache(maxsize=1)
+def _build_parser() -> argparse.ArgumentParser:
+    """
+    Build the command-line argument parser.
+
+    The parser is built once per process and reused by later calls to main().
+
+    Returns:
+        The configured ArgumentParser
+    """
+    parser = argparse.ArgumentParser(
+        description="Neuromansui: LLM-powered Sui Move contract generator and refiner",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=_CLI_EPILOG
     )
 
     # Create argument groups for better organization
     info_group = parser.add_argument_group('Information')
     input_group = parser.add_argument_group('Input Options')
+    gen_group = parser.add_argument_group('Generation Options')
     output_group = parser.add_argument_group('Output Options')
     vis_group = parser.add_argument_group('Visualization Options')
     
@@ -1551,6 +2320,26 @@ Examples:
         help="Maximum number of refinement iterations (default: 5)"
     )
 
+    # Generation arguments
+    gen_group.add_argument(
+        "--cache-dir",
+        type=str,
+        metavar="DIR",
+        help="Cache LLM responses on disk in DIR and reuse them for identical requests"
+    )
+    gen_group.add_argument(
+        "--speculative",
+        action="store_true",
+        help="Request the next revision while the current one compiles (each time the feedback changes, the unused request is still paid for)"
+    )
+    gen_group.add_argument(
+        "--candidates",
+        type=_positive_int,
+        default=1,
+        metavar="N",
+        help="Generate N candidate contracts per iteration and keep the best one (default: 1)"
+    )
+
     # Output arguments
     output_group.add_argument(
         "--save-dir",
@@ -1580,7 +2369,7 @@ Examples:
     vis_group.add_argument(
         "--dark-mode",
         action="store_true",
-        help="Use dark mode for visualizations"
+        help="Open visualizations in dark mode (the page can switch themes)"
     )
     
     # Legacy/deprecated arguments - hidden from help but still functional
@@ -1600,9 +2389,17 @@ Examples:
         help=argparse.SUPPRESS  # Hide from help
     )
     
-    args = parser.parse_args()
+    return parser
+
+
+def main():
+    """
+    Main entry point for the application.
+    """
+    args = _build_parser().parse_args()
 
     prompt_loader = PromptLoader(prompts_dir=args.prompts_dir)
+    configure_llm_cache(args.cache_dir)
 
     if args.list:
         list_available_prompts(prompt_loader)
@@ -1627,25 +2424,11 @@ Examples:
     console.print(f"[bold blue]Using prompt:[/bold blue] {args.prompt}")
     console.print(f"[blue]Description:[/blue] {prompt_loader.get_prompt_description(args.prompt)}")
 
-    # Create the Move.toml file template that will be used
-    move_toml = f"""
-[package]
-name = "TempContract"
-version = "0.0.1"
-edition = "2024.beta"
-
-[dependencies]
-Sui = {{ git = "https://github.com/MystenLabs/sui.git", subdir = "crates/sui-framework/packages/sui-framework", rev = "framework/testnet" }}
-
-[addresses]
-temp_addr = "0x0"
-"""
-
     # Enhance the prompt with the Move.toml content and module name
     enhanced_prompt = f"""
 # Move.toml configuration:
 ```
-{move_toml}
+{MOVE_TOML}
 ```
 
 # Module Name:
@@ -1659,6 +2442,8 @@ You should create a module named '{args.module_name}'
         base_prompt=enhanced_prompt,
         system_prompt=system_prompt,
         max_iterations=args.max_iterations,
+        speculative=args.speculative,
+        num_candidates=args.candidates,
     )
 
     console.print("[bold magenta]=== Final Contract Source ===[/bold magenta]")
@@ -1669,31 +2454,9 @@ You should create a module named '{args.module_name}'
     
     if should_save:
         try:
-            # Determine the output path
-            if args.output:
-                # Legacy output path
-                output_path = args.output
-                output_dir = os.path.dirname(os.path.abspath(output_path))
-                output_basename = os.path.basename(output_path)
-                contract_name = os.path.splitext(output_basename)[0]
-            else:
-                # New output path based on save-dir and name
-                output_dir = args.save_dir
-                
-                # Generate a name if not provided
-                if args.name:
-                    contract_name = args.name
-                else:
-                    # Create a name based on prompt and timestamp
-                    prompt_part = args.prompt.split('.')[-1]  # Take the last part of the prompt path
-                    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-                    contract_name = f"{prompt_part}_{timestamp}"
-                
-                # Full path for the contract file
-                output_path = os.path.join(output_dir, f"{contract_name}.move")
-            
-            # Ensure the directory exists
-            os.makedirs(output_dir, exist_ok=True)
+            # Determine the output paths
+            paths = resolve_output_paths(args)
+            output_path = paths.contract_path
             
             # Check if the file already exists and ask for confirmation
             if os.path.exists(output_path):
@@ -1704,23 +2467,18 @@ You should create a module named '{args.module_name}'
                     return
             
             # Save the contract
-            with open(output_path, "w") as f:
-                f.write(final_contract)
+            _write_atomic(output_path, (final_contract.encode("utf-8"),))
             console.print(f"[bold green]Contract saved to:[/bold green] {output_path}")
             
             # Save iteration data if requested
             if args.save_iterations:
-                if args.iterations_output:
-                    # Legacy path
-                    iterations_path = args.iterations_output
-                else:
-                    # New path based on contract name
-                    iterations_path = os.path.join(output_dir, f"{contract_name}_iterations")
+                iterations_path = paths.iterations_path
                 
                 # Check if iteration files already exist
                 if (os.path.exists(f"{iterations_path}.jsonl") or 
                     os.path.exists(f"{iterations_path}.json") or
-                    os.path.exists(f"{iterations_path}_error_chart.html")):
+                    os.path.exists(f"{iterations_path}_error_chart.html") or
+                    os.path.exists(f"{iterations_path}_error_chart_dark.html")):
                     # Only ask if we haven't already confirmed overwrite for the contract
                     if not os.path.exists(output_path) or args.iterations_output:
                         console.print(f"[bold yellow]Warning:[/bold yellow] Iteration files at {iterations_path} already exist.")
@@ -1737,27 +2495,9 @@ You should create a module named '{args.module_name}'
             
             # Generate test file if requested
             if args.generate_tests:
-                console.print(f"[bold yellow]Note:[/bold yellow] Using default --save-dir='{args.save_dir}' to store test file.")
-                # Automatically use the default save-dir
                 try:
-                    output_dir = args.save_dir
-                    # Generate a name if not provided
-                    if args.name:
-                        contract_name = args.name
-                    else:
-                        # Create a name based on prompt and timestamp
-                        prompt_part = args.prompt.split('.')[-1]  # Take the last part of the prompt path
-                        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-                        contract_name = f"{prompt_part}_{timestamp}"
-                    
-                    # Determine test file path
-                    if args.test_output:
-                        test_output_path = args.test_output
-                    else:
-                        test_output_path = os.path.join(output_dir, f"{contract_name}_test.move")
-                    
-                    # Ensure the directory exists
-                    os.makedirs(output_dir, exist_ok=True)
+                    # The test file sits next to the contract, under the same name
+                    test_output_path = paths.test_path
                     
                     # Check if test file already exists
                     if os.path.exists(test_output_path):
@@ -1769,8 +2509,7 @@ You should create a module named '{args.module_name}'
                     
                     # Generate and save the test file
                     test_file_content = generate_test_file(final_contract, system_prompt)
-                    with open(test_output_path, "w") as f:
-                        f.write(test_file_content)
+                    _write_atomic(test_output_path, (test_file_content.encode("utf-8"),))
                     console.print(f"[bold green]Test file saved to:[/bold green] {test_output_path}")
                 except Exception as e:
                     console.print(f"[bold red]Error generating test file:[/bold red] {e}")
@@ -1780,48 +2519,15 @@ You should create a module named '{args.module_name}'
         console.print("[bold yellow]Note:[/bold yellow] Using default --save-dir='{args.save_dir}' to store iteration data.")
         # Automatically use the default save-dir
         try:
-            output_dir = args.save_dir
-            # Generate a name if not provided
-            if args.name:
-                contract_name = args.name
-            else:
-                # Create a name based on prompt and timestamp
-                prompt_part = args.prompt.split('.')[-1]  # Take the last part of the prompt path
-                timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-                contract_name = f"{prompt_part}_{timestamp}"
-            
-            # Full path for iterations
-            iterations_path = os.path.join(output_dir, f"{contract_name}_iterations")
-            
-            # Ensure the directory exists
-            os.makedirs(output_dir, exist_ok=True)
-            
             # Save the iterations data
-            save_fine_tuning_data(fine_tuning_data, iterations_path, args.dark_mode)
+            save_fine_tuning_data(fine_tuning_data, resolve_output_paths(args).iterations_path, args.dark_mode)
         except Exception as e:
             console.print(f"[bold red]Error saving iteration data:[/bold red] {e}")
     elif args.generate_tests:
         console.print(f"[bold yellow]Note:[/bold yellow] Using default --save-dir='{args.save_dir}' to store test file.")
         # Automatically use the default save-dir
         try:
-            output_dir = args.save_dir
-            # Generate a name if not provided
-            if args.name:
-                contract_name = args.name
-            else:
-                # Create a name based on prompt and timestamp
-                prompt_part = args.prompt.split('.')[-1]  # Take the last part of the prompt path
-                timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-                contract_name = f"{prompt_part}_{timestamp}"
-            
-            # Determine test file path
-            if args.test_output:
-                test_output_path = args.test_output
-            else:
-                test_output_path = os.path.join(output_dir, f"{contract_name}_test.move")
-            
-            # Ensure the directory exists
-            os.makedirs(output_dir, exist_ok=True)
+            test_output_path = resolve_output_paths(args).test_path
             
             # Check if test file already exists
             if os.path.exists(test_output_path):
@@ -1833,8 +2539,7 @@ You should create a module named '{args.module_name}'
             
             # Generate and save the test file
             test_file_content = generate_test_file(final_contract, system_prompt)
-            with open(test_output_path, "w") as f:
-                f.write(test_file_content)
+            _write_atomic(test_output_path, (test_file_content.encode("utf-8"),))
             console.print(f"[bold green]Test file saved to:[/bold green] {test_output_path}")
         except Exception as e:
             console.print(f"[bold red]Error generating test file:[/bold red] {e}")
@@ -5,11 +5,74 @@ This module provides functions to load prompts from YAML files.
 """
 
 import os
+import pickle
+import hashlib
+import functools
 import yaml
 from typing import Dict, Any, List, Optional
 import json
-import re
-from collections import defaultdict
+from collections import Counter
+
+try:
+    import orjson
+except ImportError:  # optional speedup, see the "fast" extra
+    orjson = None
+
+
+# libyaml's C loader is much faster; fall back to the pure-Python one without it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# File extensions of prompt files, in the order a namespace's file is looked up
+_PROMPT_EXTENSIONS = ('.yaml', '.yml')
+# The same extensions without the dot, for checking a split-off suffix
+_PROMPT_SUFFIXES = frozenset(extension[1:] for extension in _PROMPT_EXTENSIONS)
+
+# Directory under the user's cache directory ($XDG_CACHE_HOME, or ~/.cache) that
+# caches parsed prompt files between runs, one file per prompts directory
+_CACHE_DIR_NAME = 'neuromansui'
+
+
+# Shared decoder for scanning compiler output for its JSON array of diagnostics
+_JSON_DECODER = json.JSONDecoder()
+
+
+# Severity prefix of each diagnostic level; other levels use their first letter
+_SEV_PREFIXES = {
+    "BlockingError": "E",
+    "NonblockingError": "N",
+    "Warning": "W",
+    "Note": "I",
+    "Bug": "ICE",
+    "Error": "E",
+}
+
+
+# Full prefixes of special (level, code) combinations: linter warnings are code 4
+_SPECIAL_PREFIXES = {
+    ("Warning", 4): "Lint W",
+}
+
+
+# System prompt used when a prompt does not define its own
+DEFAULT_SYSTEM_PROMPT = "You are an expert in Sui Move smart contract development."
+
+
+def _cache_path(prompts_dir: str) -> str:
+    """
+    Return the parsed-file cache of a prompts directory.
+    
+    The cache lives in the user's cache directory rather than next to the prompts,
+    named after a hash of the directory's absolute path.
+    
+    Args:
+        prompts_dir: Path to the directory containing prompt YAML files
+        
+    Returns:
+        Path of the cache file
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    key = hashlib.sha256(os.path.abspath(prompts_dir).encode()).hexdigest()[:16]
+    return os.path.join(cache_home, _CACHE_DIR_NAME, f"prompts-{key}.pkl")
 
 
 class PromptLoader:
@@ -21,61 +84,182 @@ class PromptLoader:
         """
         Initialize the PromptLoader with the directory containing prompt files.
         
+        Prompt files are parsed lazily: a namespace is loaded the first time one
+        of its prompts is requested, and the whole directory only when listing.
+        
         Args:
             prompts_dir: Path to the directory containing prompt YAML files
         """
+        if not os.path.exists(prompts_dir):
+            raise FileNotFoundError(f"Prompts directory not found: {prompts_dir}")
+        
         self.prompts_dir = prompts_dir
         self.prompts = {}
-        self._load_all_prompts()
+        # 'namespace.prompt_name' -> prompt data, filled as namespaces are loaded
+        self._flat = {}
+        self._all_loaded = False
+        # file name -> ((mtime_ns, size), parsed data), read from _cache_path when first needed
+        self._cache_path = _cache_path(prompts_dir)
+        self._cache = None
+        self._cache_dirty = False
+    
+    def _load_file(self, file_path: str, namespace: str) -> None:
+        """
+        Parse one prompt file and store its prompts under their namespace.
+        
+        Args:
+            file_path: Path to the prompt YAML file
+            namespace: Namespace to store the prompts under
+        """
+        try:
+            prompt_data = self._parse_file(file_path)
+                
+            # Store prompts under their namespace, and index them by their full path
+            if prompt_data:
+                self.prompts[namespace] = prompt_data
+                for prompt_name, data in prompt_data.items():
+                    self._flat[f"{namespace}.{prompt_name}"] = data
+        except Exception as e:
+            print(f"Error loading prompt file {file_path}: {e}")
+    
+    def _parse_file(self, file_path: str) -> Any:
+        """
+        Parse a prompt file, reusing the cached result while the file is unchanged.
+        
+        Unpickling is much faster than parsing YAML, so a file is only parsed again
+        when its modification time or size differs from the cached entry.
+        
+        Args:
+            file_path: Path to the prompt YAML file
+            
+        Returns:
+            The parsed contents of the file
+        """
+        file_name = os.path.basename(file_path)
+        stat = os.stat(file_path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        
+        if self._cache is None:
+            self._cache = self._read_cache()
+        cached = self._cache.get(file_name)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        
+        # libyaml reads the raw bytes and detects their encoding itself
+        with open(file_path, 'rb') as file:
+            prompt_data = yaml.load(file, Loader=_YAML_LOADER)
+        
+        self._cache[file_name] = (stamp, prompt_data)
+        self._cache_dirty = True
+        return prompt_data
+    
+    def _read_cache(self) -> Dict[str, Any]:
+        """
+        Read the parsed-file cache, treating a missing or unreadable cache as empty.
+        """
+        try:
+            with open(self._cache_path, 'rb') as file:
+                cache = pickle.load(file)
+            return cache if isinstance(cache, dict) else {}
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return {}
+    
+    def _write_cache(self) -> None:
+        """
+        Write the parsed-file cache if files were parsed since it was read.
+        
+        The cache is replaced in a single rename; a cache directory that cannot
+        be written to simply leaves the prompts uncached.
+        """
+        if not self._cache_dirty:
+            return
+        self._cache_dirty = False
+        
+        cache_path = self._cache_path
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(tmp_path, 'wb') as file:
+                pickle.dump(self._cache, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    
+    def _load_namespace(self, namespace: str) -> None:
+        """
+        Load the prompt file of a single namespace, unless it is already loaded.
+        
+        Args:
+            namespace: The namespace, i.e. the prompt file name without extension
+        """
+        if namespace in self.prompts or self._all_loaded:
+            return
+        
+        for extension in _PROMPT_EXTENSIONS:
+            file_path = os.path.join(self.prompts_dir, namespace + extension)
+            if os.path.isfile(file_path):
+                self._load_file(file_path, namespace)
+                self._write_cache()
+                return
     
     def _load_all_prompts(self) -> None:
         """
         Load all prompt files from the prompts directory.
         """
-        if not os.path.exists(self.prompts_dir):
-            raise FileNotFoundError(f"Prompts directory not found: {self.prompts_dir}")
+        if self._all_loaded:
+            return
         
-        for filename in os.listdir(self.prompts_dir):
-            if filename.endswith(('.yaml', '.yml')):
-                file_path = os.path.join(self.prompts_dir, filename)
-                namespace = os.path.splitext(filename)[0]
-                
-                try:
-                    with open(file_path, 'r') as file:
-                        prompt_data = yaml.safe_load(file)
-                        
-                    # Store prompts under their namespace
-                    if prompt_data:
-                        self.prompts[namespace] = prompt_data
-                except Exception as e:
-                    print(f"Error loading prompt file {file_path}: {e}")
+        # scandir entries carry their file type, so directories are skipped without a stat
+        with os.scandir(self.prompts_dir) as entries:
+            for entry in entries:
+                # One split yields both the namespace and the extension
+                namespace, _, suffix = entry.name.rpartition('.')
+                if namespace and suffix in _PROMPT_SUFFIXES and entry.is_file():
+                    if namespace not in self.prompts:
+                        self._load_file(entry.path, namespace)
+        self._write_cache()
+        self._all_loaded = True
     
-    def get_prompt(self, prompt_path: str) -> tuple[Optional[str], Optional[str]]:
+    def _resolve(self, prompt_path: str) -> Optional[Any]:
         """
-        Get a prompt by its path in the format 'namespace.prompt_name'.
+        Look up the data of a prompt by its path, loading its namespace if needed.
         
         Args:
             prompt_path: Path to the prompt in format 'namespace.prompt_name'
             
         Returns:
-            Tuple of (prompt content, system prompt) or (None, None) if not found
+            The prompt's mapping from its YAML file, or None if not found
         """
-        parts = prompt_path.split('.')
+        prompt_data = self._flat.get(prompt_path)
+        if prompt_data is not None:
+            return prompt_data
         
-        if len(parts) != 2:
+        namespace, sep, prompt_name = prompt_path.partition('.')
+        if not sep or '.' in prompt_name:
             raise ValueError("Prompt path should be in format 'namespace.prompt_name'")
         
-        namespace, prompt_name = parts
-        
-        if namespace not in self.prompts:
-            return None, None
+        self._load_namespace(namespace)
+        return self._flat.get(prompt_path)
+    
+    def get_prompt(self, prompt_path: str) -> tuple[Optional[str], Optional[str]]:
+        """
+        Get a prompt by its path in the format 'namespace.prompt_name'.
         
-        prompt_data = self.prompts[namespace].get(prompt_name)
+        Args:
+            prompt_path: Path to the prompt in format 'namespace.prompt_name'
+            
+        Returns:
+            Tuple of (prompt content, system prompt) or (None, None) if not found
+        """
+        prompt_data = self._resolve(prompt_path)
         if not prompt_data:
             return None, None
         
         content = prompt_data.get('content')
-        system_prompt = prompt_data.get('system_prompt', "You are an expert in Sui Move smart contract development.")
+        system_prompt = prompt_data.get('system_prompt', DEFAULT_SYSTEM_PROMPT)
         
         return content, system_prompt
     
@@ -86,11 +270,8 @@ class PromptLoader:
         Returns:
             List of prompt paths in format 'namespace.prompt_name'
         """
-        result = []
-        for namespace, prompts in self.prompts.items():
-            for prompt_name in prompts.keys():
-                result.append(f"{namespace}.{prompt_name}")
-        return result
+        self._load_all_prompts()
+        return list(self._flat)
     
     def get_prompt_description(self, prompt_path: str) -> Optional[str]:
         """
@@ -102,22 +283,26 @@ class PromptLoader:
         Returns:
             The prompt description or None if not found
         """
-        parts = prompt_path.split('.')
-        
-        if len(parts) != 2:
-            raise ValueError("Prompt path should be in format 'namespace.prompt_name'")
-        
-        namespace, prompt_name = parts
-        
-        if namespace not in self.prompts:
-            return None
-        
-        prompt_data = self.prompts[namespace].get(prompt_name)
+        prompt_data = self._resolve(prompt_path)
         if prompt_data and 'description' in prompt_data:
             return prompt_data['description']
         
         return None
 
+    def all_descriptions(self) -> Dict[str, Optional[str]]:
+        """
+        Get the descriptions of all available prompts in one pass.
+        
+        Returns:
+            Dictionary mapping prompt paths ('namespace.prompt_name') to their
+            descriptions (None where a prompt has none)
+        """
+        self._load_all_prompts()
+        return {
+            prompt_path: prompt_data.get('description') if isinstance(prompt_data, dict) else None
+            for prompt_path, prompt_data in self._flat.items()
+        }
+
 def compute_error_code(error: dict) -> str:
     """
     Compute a standardized error code for an error object.
@@ -144,36 +329,61 @@ def compute_error_code(error: dict) -> str:
     category_val = error.get("category")
     external_prefix = error.get("external_prefix")
 
-    match level:
-        case "BlockingError":
-            sev_prefix = "E"
-        case "NonblockingError":
-            sev_prefix = "N"
-        case "Warning":
-            sev_prefix = "W"
-        case "Note":
-            sev_prefix = "I"
-        case "Bug":
-            sev_prefix = "ICE"
-        case "Error":
-            sev_prefix = "E"
-        case _:
-            sev_prefix = level[0] if level else ""
+    try:
+        return _format_error_code(level, code_val, category_val, external_prefix)
+    except TypeError:
+        # Unhashable field values cannot be cached; format them directly
+        return _format_error_code.__wrapped__(level, code_val, category_val, external_prefix)
+
+@functools.lru_cache(maxsize=1024, typed=True)
+def _format_error_code(level: str, code_val, category_val, external_prefix) -> str:
+    """
+    Format the error code of one combination of error fields, see `compute_error_code`.
+
+    Compiler output repeats the same few combinations many times, so results are cached.
+    """
+    # Special cases replace the whole prefix, including any external prefix
+    try:
+        prefix = _SPECIAL_PREFIXES.get((level, code_val))
+    except TypeError:
+        # An unhashable code is never one of the special cases
+        prefix = None
+    if prefix is None:
+        prefix = _SEV_PREFIXES.get(level) or (level[0] if level else "")
+        if external_prefix:
+            prefix = f"{external_prefix}{prefix}"
 
     # Format code as code then category (instead of category then code)
     # Pad code to 2 digits and category to 3 digits
-    code_str = str(code_val).zfill(2)
-    cat_str = str(category_val).zfill(3)
+    return f"{prefix}{str(code_val).zfill(2)}{str(category_val).zfill(3)}"
+
+def _scan_json_array(text: str) -> list:
+    """
+    Decode the first JSON array in a text, skipping brackets that do not start one.
+
+    Each candidate "[" is decoded in place, and decoding stops at the end of the
+    array, so brackets inside error messages and trailing text are handled.
+
+    Args:
+        text: Text containing a JSON array
 
-    # Special handling for linter warnings (code 4)
-    if code_val == 4 and level == "Warning":
-        return f"Lint {sev_prefix}{code_str}{cat_str}"
+    Returns:
+        The decoded array
+    """
+    error = None
+    start = text.find("[")
+    while start != -1:
+        try:
+            value, _ = _JSON_DECODER.raw_decode(text, start)
+            if isinstance(value, list):
+                return value
+        except ValueError as e:
+            error = error or e
+        start = text.find("[", start + 1)
+    raise ValueError(f"Error parsing JSON: {error}")
 
-    if external_prefix:
-        return f"{external_prefix}{sev_prefix}{code_str}{cat_str}"
-    return f"{sev_prefix}{code_str}{cat_str}"
 
-def collect_errors(compiler_output: str) -> dict[str, list[dict]]:
+def collect_errors(compiler_output: str | bytes) -> dict[str, list[dict]]:
     """
     Extract error objects from the compiler output and group them by a computed error code.
 
@@ -182,24 +392,53 @@ def collect_errors(compiler_output: str) -> dict[str, list[dict]]:
     and groups the errors in a dictionary keyed by those computed codes.
 
     Args:
-        compiler_output: A string containing the compiler output, including a JSON array of errors.
+        compiler_output: The compiler output, including a JSON array of errors.
+            Raw bytes are parsed without decoding them first where possible.
 
     Returns:
         A dictionary mapping computed error codes to lists of error dictionaries.
     """
-    match_obj = re.search(r"(\[.*?\])", compiler_output, re.DOTALL)
-    if not match_obj:
+    is_bytes = isinstance(compiler_output, bytes)
+    start = compiler_output.find(b"[" if is_bytes else "[")
+    if start == -1:
         raise ValueError("No JSON array found in the compiler output.")
     
-    json_str = match_obj.group(1)
-    try:
-        errors_list = json.loads(json_str)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Error parsing JSON: {e}")
+    errors_list = None
+    if orjson is not None:
+        # The array usually runs from the first "[" to the last "]"; orjson is several
+        # times faster on the multi-KB arrays a broken contract produces
+        end = compiler_output.rfind(b"]" if is_bytes else "]") + 1
+        try:
+            errors_list = orjson.loads(compiler_output[start:end])
+        except ValueError:
+            pass
+    if not isinstance(errors_list, list):
+        text = compiler_output.decode("utf-8", errors="replace") if is_bytes else compiler_output
+        errors_list = _scan_json_array(text)
     
-    grouped_errors = defaultdict(list)
+    grouped_errors: dict[str, list[dict]] = {}
     for error in errors_list:
-        error_code = compute_error_code(error)
-        grouped_errors[error_code].append(error)
+        grouped_errors.setdefault(compute_error_code(error), []).append(error)
     
-    return dict(grouped_errors)
+    return grouped_errors
+
+
+def count_distinct_errors(grouped_errors: dict[str, list[dict]]) -> list[tuple[str, str, str, int]]:
+    """
+    Collapse textually identical errors into a single record with an occurrence count.
+
+    A broken import typically produces the same message many times over; reporting it
+    once per distinct (code, level, message) keeps the error table short.
+
+    Args:
+        grouped_errors: Errors grouped by error code, as returned by `collect_errors`.
+
+    Returns:
+        A list of (code, level, msg, count) tuples, in order of first occurrence.
+    """
+    counts = Counter(
+        (code, error.get("level", "Unknown"), error.get("msg", ""))
+        for code, errors in grouped_errors.items()
+        for error in errors
+    )
+    return [(code, level, msg, count) for (code, level, msg), count in counts.items()]
@@ -0,0 +1,40 @@
+"""
+Shared fakes for the compiler process and API responses, imported by test_main.
+"""
+
+import io
+from types import SimpleNamespace
+
+
+# A simple fake Popen to simulate a compiler process streaming its stderr.
+class FakePopen:
+    def __init__(self, returncode: int, stderr: bytes):
+        self.returncode = returncode
+        self.stderr = io.BytesIO(stderr)
+
+    def wait(self):
+        return self.returncode
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stderr.close()
+
+
+class FakeCompiler:
+    """A stand-in for subprocess.Popen that records every build it is asked to run."""
+
+    def __init__(self):
+        self.returncode = 0
+        self.stderr = b"Compilation Successful"
+        self.builds = []
+
+    def __call__(self, args, cwd, stdout, stderr):
+        self.builds.append((args, cwd))
+        return FakePopen(self.returncode, self.stderr)
+
+
+def dummy_response(content: str) -> SimpleNamespace:
+    """Build a chat completion response carrying a single message."""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
@@ -1,5 +1,5 @@
 import textwrap
-from neuromansui.prompt_loader import collect_errors
+from neuromansui.prompt_loader import collect_errors, compute_error_code, count_distinct_errors
 
 def test_collect_errors():
     sample_output = textwrap.dedent("""\
@@ -96,4 +96,50 @@ def test_collect_errors():
     assert "Lint W04001" in errors_by_code, "Expected group 'Lint W04001' is missing"
     assert len(errors_by_code["Lint W04001"]) == 1, "Expected 1 error in group 'Lint W04001'"
     
-    assert len(errors_by_code) == 4, "Expected a total of 4 error groups" 
\ No newline at end of file
+    assert len(errors_by_code) == 4, "Expected a total of 4 error groups"
+
+    # Raw compiler bytes are accepted as well and grouped identically
+    assert collect_errors(sample_output.encode()) == errors_by_code
+
+
+def test_count_distinct_errors():
+    grouped_errors = {
+        "E03001": [
+            {"level": "Error", "msg": "unbound module 'Coin'"},
+            {"level": "Error", "msg": "unbound module 'Coin'"},
+            {"level": "Error", "msg": "unbound module 'Balance'"},
+        ],
+        "W02004": [
+            {"level": "Warning", "msg": "unused variable 'x'"},
+        ],
+    }
+
+    assert count_distinct_errors(grouped_errors) == [
+        ("E03001", "Error", "unbound module 'Coin'", 2),
+        ("E03001", "Error", "unbound module 'Balance'", 1),
+        ("W02004", "Warning", "unused variable 'x'", 1),
+    ]
+
+
+def test_collect_errors_with_brackets_in_messages():
+    sample_output = textwrap.dedent("""\
+        BUILDING Coins [dev]
+        [
+          {"level": "Error", "category": 3, "code": 2, "msg": "expected 'vector<u8>', found '[u8]'"},
+          {"level": "Warning", "category": 4, "code": 2, "msg": "unused variable 'x'"}
+        ]
+        Failed to build Move modules: Compilation error [exit 1].
+    """)
+
+    errors_by_code = collect_errors(sample_output)
+
+    assert errors_by_code["E02003"][0]["msg"] == "expected 'vector<u8>', found '[u8]'"
+    assert len(errors_by_code["W02004"]) == 1
+    assert collect_errors(sample_output.encode()) == errors_by_code
+
+
+def test_compute_error_code_with_unhashable_fields():
+    # Unusual field values are formatted as text instead of breaking the error code cache
+    assert compute_error_code({"level": "Warning", "code": [1], "category": 2}) == "W[1]002"
+    assert compute_error_code({"level": "Warning", "code": 4, "category": [1]}) == "Lint W04[1]"
+    assert compute_error_code({"level": "Warning", "code": 4, "category": 1}) == "Lint W04001"
@@ -1,152 +1,259 @@
 import json
-import subprocess
 import re
 import tempfile
 import shutil
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import Dict, List
-from unittest.mock import MagicMock
 
 import pytest
 
-# Import the functions and dataclasses from our main module.
+from _fakes import FakeCompiler, dummy_response
+
+# Import the functions and dataclasses from our main module, and the module
+# itself for patching its globals.
+import neuromansui.main as main_module
 from neuromansui.main import (
     compile_contract,
+    init_move_project,
     generate_contract,
     iterative_evaluation,
     CompilationResult,
     CompilationFeedback,
+    render_prompt,
+    resolve_output_paths,
+    save_fine_tuning_data,
+    split_compiler_output,
+    generate_error_chart,
+    main,
+    _build_parser,
+    _CHART_THEMES,
 )
 
-# A simple fake CompletedProcess to simulate subprocess.run results.
-class FakeCompletedProcess:
-    def __init__(self, returncode: int, stderr: str):
-        self.returncode = returncode
-        self.stderr = stderr
-        self.stdout = ""
+# The OpenAI client's chat completions endpoint, patched by the generation tests.
+CLIENT_COMPLETIONS = main_module.client.chat.completions
 
+# Dummy responses simulating the OpenAI API, built once and returned as is.
+GENERATED_RESPONSE = dummy_response("dummy contract generated")
+CACHED_RESPONSE = dummy_response("cached contract")
 
+# Inputs shared by the tests; none of them is modified.
+DUMMY_SOURCE = "module Dummy {}"
+BASE_PROMPT = "base prompt"
+SYSTEM_PROMPT = "system prompt"
 
-def test_compile_contract_success(monkeypatch):
-    """
-    Test the success path of compile_contract.
-    We simulate a successful compiler run by patching subprocess.run.
-    """
-    call_count = 0
+# SGR colour sequences, as the mocked strip_ansi removes them.
+ANSI_COLOR_RE = re.compile(r"\x1b\[[0-9;]*m")
 
-    def fake_run(args, cwd, capture_output, text):
-        nonlocal call_count
-        call_count += 1
-        # For "json-errors" call, return a dummy value (not used when success)
-        if "json-errors" in args:
-            return FakeCompletedProcess(0, "")
-        else:
-            # For primary build call, simulate a successful run.
-            return FakeCompletedProcess(0, "Compilation Successful output with no errors")
+# The single error reported by a failed dummy build.
+DUMMY_ERROR = {
+    "file": "dummy.move",
+    "line": 1,
+    "column": 1,
+    "level": "Error",
+    "category": 1,
+    "code": 123,
+    "msg": "dummy error",
+}
 
-    monkeypatch.setattr(subprocess, "run", fake_run)
+# The errors of a failed dummy build, grouped by code as collect_errors returns them.
+DUMMY_GROUPED_ERRORS = {"E123001": [DUMMY_ERROR]}
 
-    dummy_source = "module Dummy {}"
-    result: CompilationResult = compile_contract(dummy_source)
-    assert result.is_successful is True
-    assert "Compilation Successful" in result.status_message
-    assert result.stats["errors"] == 0
-    # The verbose output should be cleaned of any ANSI codes
-    assert result.feedback.verbose_output == "Compilation Successful output with no errors"
+# The compiler output of a failed dummy build: its log, then the JSON error array.
+DUMMY_ERROR_OUTPUT = b"Compilation error occurred\n" + json.dumps([DUMMY_ERROR], indent=2).encode()
 
 
-def test_compile_contract_error(monkeypatch):
-    """
-    Test the error path of compile_contract.
-    We simulate a failed compiler run and a JSON error array for collect_errors.
-    """
-    # Track how many times collect_errors is called
-    collect_errors_calls = 0
-    
-    # Create a dummy JSON error output that will be successfully parsed
-    dummy_json = """
+@pytest.fixture(autouse=True)
+def clear_compile_cache(monkeypatch):
+    """Give every test an empty compilation memo."""
+    monkeypatch.setattr(main_module, "_compile_cache", OrderedDict())
+
+
+@pytest.fixture
+def fake_compiler(monkeypatch):
+    """Replace the compiler process with a FakeCompiler that succeeds by default."""
+    compiler = FakeCompiler()
+    monkeypatch.setattr(main_module.subprocess, "Popen", compiler)
+    return compiler
+
+
+@pytest.mark.parametrize(
+    "returncode, stderr, expected_log, expected_status, expected_errors",
     [
-      {
-        "file": "dummy.move",
-        "line": 1,
-        "column": 1,
-        "level": "Error",
-        "category": 1,
-        "code": 123,
-        "msg": "dummy error"
-      }
-    ]
+        (0, b"Compilation Successful output with no errors",
+         "Compilation Successful output with no errors", "Compilation Successful", 0),
+        (1, DUMMY_ERROR_OUTPUT,
+         "Compilation error occurred", "Compilation Error", 1),
+    ],
+    ids=["success", "error"],
+)
+def test_compile_contract(monkeypatch, fake_compiler, returncode, stderr, expected_log, expected_status, expected_errors):
     """
+    Test the success and error paths of compile_contract.
+    We simulate the compiler run by patching subprocess.Popen; a failed run prints
+    plain text (no ANSI codes) followed by a JSON error array for collect_errors.
+    """
+    fake_compiler.returncode = returncode
+    fake_compiler.stderr = stderr
 
-    def fake_run(args, cwd, capture_output, text):
-        if "--json-errors" in args:
-            return FakeCompletedProcess(1, dummy_json)
-        else:
-            # Simulate a failed run with plain text (no ANSI codes)
-            return FakeCompletedProcess(1, "Compilation error occurred")
+    # Track how many times collect_errors is called
+    collect_errors_calls = [0]
 
     # Create a mock collect_errors function
     def mock_collect_errors(output_str):
-        nonlocal collect_errors_calls
-        collect_errors_calls += 1
-        return {
-            "E123001": [
-                {
-                    "file": "dummy.move", 
-                    "line": 1, 
-                    "column": 1, 
-                    "level": "Error", 
-                    "category": 1, 
-                    "code": 123, 
-                    "msg": "dummy error"
-                }
-            ]
-        }
+        collect_errors_calls[0] += 1
+        return DUMMY_GROUPED_ERRORS
 
     # Also mock the strip_ansi function to make sure it's used
     def mock_strip_ansi(text):
-        return text.replace("\x1b[31m", "").replace("\x1b[0m", "")
+        return ANSI_COLOR_RE.sub("", text)
 
     # Replace the real functions with our mocks
-    monkeypatch.setattr(subprocess, "run", fake_run)
-    monkeypatch.setattr("neuromansui.main.collect_errors", mock_collect_errors)
-    monkeypatch.setattr("neuromansui.main.strip_ansi", mock_strip_ansi)
+    monkeypatch.setattr(main_module, "collect_errors", mock_collect_errors)
+    monkeypatch.setattr(main_module, "strip_ansi", mock_strip_ansi)
 
     # Run the compile function
-    dummy_source = "module Dummy {}"
-    result = compile_contract(dummy_source)
-    
-    # Verify our mock was called
-    assert collect_errors_calls == 1
-    
+    result: CompilationResult = compile_contract(DUMMY_SOURCE)
+
+    # A single build run reports both the build log and the JSON errors.
+    assert len(fake_compiler.builds) == 1
+    assert "--json-errors" in fake_compiler.builds[0][0]
+    # Only a failed build has errors to collect
+    assert collect_errors_calls[0] == (returncode != 0)
+
     # Verify the result
-    assert result.is_successful is False
-    assert "errors" in result.stats
-    assert result.stats["errors"] > 0
-    assert "Compilation error occurred" in result.feedback.verbose_output
-    assert "dummy error" in result.feedback.error_table
+    assert result.is_successful is (returncode == 0)
+    assert expected_status in result.status_message
+    assert result.stats["errors"] == expected_errors
+    # The verbose output is the build log, without the JSON errors
+    assert result.feedback.verbose_output.rstrip("\n") == expected_log
+    if not result.is_successful:
+        assert "dummy error" in result.feedback.error_table
+        assert "dummy error" in result.feedback.console_tables
+        assert "E123001 [Error] at dummy.move:1: dummy error" in result.feedback.to_prompt_text()
+
+
+def test_split_compiler_output_bracketed_log_lines():
+    """
+    Test that build log lines starting with a bracket are not taken for the JSON array.
+    """
+    log = b"[warning] Dependency cache is stale\n[note] Rebuilding TempContract\n"
+    verbose, diagnostics = split_compiler_output((log + DUMMY_ERROR_OUTPUT).splitlines(keepends=True))
+
+    assert verbose == log + b"Compilation error occurred\n"
+    assert json.loads(diagnostics) == [DUMMY_ERROR]
+
+
+def test_compile_contract_reuses_project_dir(fake_compiler, tmp_path):
+    """
+    Test that compile_contract builds inside a caller-provided Move package
+    and leaves it in place for the next compilation.
+    """
+    init_move_project(str(tmp_path))
+    compile_contract("module First {}", str(tmp_path))
+    compile_contract("module Second {}", str(tmp_path))
+
+    assert [cwd for _, cwd in fake_compiler.builds] == [str(tmp_path), str(tmp_path)]
+    assert (tmp_path / "Move.toml").exists()
+    assert (tmp_path / "sources" / "temp_contract.move").read_text() == "module Second {}"
+
+
+def test_compile_contract_shared_build_dir(monkeypatch, fake_compiler):
+    """
+    Test that compilations without a project_dir share one lazily created package.
+    """
+    monkeypatch.setattr(main_module, "_build_dir", None)
+
+    compile_contract("module First {}")
+    compile_contract("module Second {}")
+
+    build_dirs = [cwd for _, cwd in fake_compiler.builds]
+    assert len(build_dirs) == 2
+    assert build_dirs[0] == build_dirs[1]
+
+
+def test_compile_contract_memoized(fake_compiler):
+    """
+    Test that compiling an identical contract twice only runs the compiler once.
+    """
+    first = compile_contract(DUMMY_SOURCE)
+    second = compile_contract(DUMMY_SOURCE)
+    assert len(fake_compiler.builds) == 1
+    assert second is first
+
+    compile_contract("module Other {}")
+    assert len(fake_compiler.builds) == 2
+
+
+def test_compile_contract_memo_bounded(monkeypatch, fake_compiler):
+    """
+    Test that the memo evicts the least recently used result once it is full.
+    """
+    monkeypatch.setattr(main_module, "_COMPILE_CACHE_SIZE", 2)
+    compile_contract("module First {}")
+    compile_contract("module Second {}")
+    compile_contract("module First {}")  # First is now the most recently used
+    compile_contract("module Third {}")  # Evicts Second
+    assert len(fake_compiler.builds) == 3
+
+    compile_contract("module First {}")
+    assert len(fake_compiler.builds) == 3
+    compile_contract("module Second {}")
+    assert len(fake_compiler.builds) == 4
+
+
+def test_compile_contract_unparsed_errors_not_memoized(fake_compiler):
+    """
+    Test that a failed build whose diagnostics cannot be parsed is compiled again.
+    """
+    fake_compiler.returncode = 1
+    fake_compiler.stderr = b"Compilation error occurred\nno diagnostics here\n"
+    first = compile_contract(DUMMY_SOURCE)
+    assert "Error extracting error details" in first.feedback.verbose_output
+
+    compile_contract(DUMMY_SOURCE)
+    assert len(fake_compiler.builds) == 2
+
+
+def test_feedback_prompt_text():
+    """
+    Test that the prompt feedback uses the error table and only the tail of the build log.
+    """
+    log = "\n".join(f"log line {n}" for n in range(50))
+    feedback = CompilationFeedback(verbose_output=log, error_table="E01001 table", spans_table="span table")
+
+    text = feedback.to_prompt_text(max_log_lines=5)
+    assert "E01001 table" in text
+    assert "span table" in text
+    assert "log line 49" in text
+    assert "log line 44" not in text
+
+    # Without a parsed error table the full build log is used.
+    assert CompilationFeedback(verbose_output=log).to_prompt_text() == log
+
+
+def test_render_prompt():
+    """
+    Test that prompts are escaped and their fenced code blocks become code block markup.
+    """
+    html = render_prompt("Use <coin>:\n```move\nlet x = a && b;\n```\nand ```\nplain\n```")
+
+    assert html.startswith("Use &lt;coin&gt;:\n")
+    assert '<code class="language-move">let x = a &amp;&amp; b;\n</code>' in html
+    assert '<code class="language-plaintext">plain\n</code>' in html
+    assert "```" not in html
+    assert render_prompt("no fences & more") == "no fences &amp; more"
 
 
 def test_generate_contract(monkeypatch):
     """
     Test generate_contract by patching the OpenAI client.
     """
-    # Create a dummy response simulating the OpenAI API response.
-    class DummyResponse:
-        class DummyChoice:
-            class DummyMessage:
-                content = "dummy contract generated"
-            message = DummyMessage()
-        choices = [DummyChoice()]
-
     def fake_create(**kwargs):
-        return DummyResponse()
+        return GENERATED_RESPONSE
 
     # Patch the OpenAI client's chat.completions.create function.
-    # We use the __globals__ of generate_contract to access the client.
-    monkeypatch.setattr(
-        generate_contract.__globals__['client'].chat.completions, "create", fake_create
-    )
+    monkeypatch.setattr(CLIENT_COMPLETIONS, "create", fake_create)
 
     prompt = "Generate a dummy contract"
     system_prompt = "System prompt dummy"
@@ -154,6 +261,28 @@ def test_generate_contract(monkeypatch):
     assert result == "dummy contract generated"
 
 
+def test_generate_contract_cache(monkeypatch, tmp_path):
+    """
+    Test that identical requests are served from the on-disk response cache.
+    """
+    api_calls = []
+
+    def fake_create(**kwargs):
+        api_calls.append(kwargs)
+        return CACHED_RESPONSE
+
+    monkeypatch.setattr(CLIENT_COMPLETIONS, "create", fake_create)
+    monkeypatch.setattr(main_module, "_llm_cache_dir", str(tmp_path))
+
+    first = generate_contract("Generate a dummy contract", "System prompt dummy")
+    second = generate_contract("Generate a dummy contract", "System prompt dummy")
+
+    assert first == second == "cached contract"
+    # Only the first request should reach the API
+    assert len(api_calls) == 1
+    assert len(list(tmp_path.iterdir())) == 1
+
+
 def test_iterative_evaluation(monkeypatch):
     """
     Test iterative_evaluation by overriding generate_contract and compile_contract.
@@ -161,15 +290,15 @@ def test_iterative_evaluation(monkeypatch):
     Simulate a scenario where the first compilation fails and the second succeeds.
     """
     # A counter to count compile_contract calls.
-    call_counter = {"compile": 0}
+    call_counter = [0]
 
     def dummy_generate_contract(prompt: str, system_prompt: str) -> str:
         # Always return the same dummy contract.
         return "dummy contract"
 
-    def dummy_compile_contract(source: str) -> CompilationResult:
-        call_counter["compile"] += 1
-        if call_counter["compile"] == 1:
+    def dummy_compile_contract(source: str, project_dir: str = None) -> CompilationResult:
+        call_counter[0] += 1
+        if call_counter[0] == 1:
             # First iteration fails.
             feedback = CompilationFeedback(verbose_output="error")
             return CompilationResult(
@@ -188,47 +317,154 @@ def test_iterative_evaluation(monkeypatch):
                 stats={"errors": 0, "compiler_warnings": 0, "linter_warnings": 0},
             )
 
-    monkeypatch.setattr("neuromansui.main.generate_contract", dummy_generate_contract)
-    monkeypatch.setattr("neuromansui.main.compile_contract", dummy_compile_contract)
+    monkeypatch.setattr(main_module, "generate_contract", dummy_generate_contract)
+    monkeypatch.setattr(main_module, "compile_contract", dummy_compile_contract)
 
-    base_prompt = "base prompt"
-    system_prompt = "system prompt"
-    final_contract, fine_tuning_data = iterative_evaluation(base_prompt, system_prompt, max_iterations=2)
+    final_contract, fine_tuning_data = iterative_evaluation(BASE_PROMPT, SYSTEM_PROMPT, max_iterations=2)
     # The final contract should be our dummy generated contract.
     assert final_contract == "dummy contract"
     # We should have invoked compile_contract twice.
-    assert call_counter["compile"] == 2
+    assert call_counter[0] == 2
+
+
+def test_saved_dataset_contains_compiler_errors(monkeypatch, fake_compiler, tmp_path):
+    """
+    Test that the compiler's error messages become the fine-tuning target of a failed iteration.
+    """
+    fake_compiler.returncode = 1
+    fake_compiler.stderr = DUMMY_ERROR_OUTPUT
+    monkeypatch.setattr(main_module, "generate_contract", lambda prompt, system_prompt: DUMMY_SOURCE)
+
+    _, fine_tuning_data = iterative_evaluation(BASE_PROMPT, SYSTEM_PROMPT, max_iterations=1)
+    assert "dummy error" in fine_tuning_data[0]["compiler_output"]
+
+    save_fine_tuning_data(fine_tuning_data, str(tmp_path / "run"), write_reference_json=False)
+    example = json.loads((tmp_path / "run.jsonl").read_text().splitlines()[0])
+    assert example["messages"][1]["content"] == DUMMY_SOURCE
+    assert "E123001 [Error] at dummy.move:1: dummy error" in example["messages"][2]["content"]
+
+
+def test_iterative_evaluation_speculative(monkeypatch):
+    """
+    Test that a speculative generation is used once the compiler feedback stops changing.
+    """
+    generate_calls = []
+
+    def dummy_generate_contract(prompt: str, system_prompt: str) -> str:
+        generate_calls.append(prompt)
+        return f"contract {len(generate_calls)}"
+
+    def dummy_chat_completion(model: str, system_prompt: str, prompt: str) -> str:
+        return "speculative contract"
+
+    def dummy_compile_contract(source: str, project_dir: str = None) -> CompilationResult:
+        # Every revision fails with the same feedback.
+        return CompilationResult(
+            is_successful=False,
+            status_message="dummy error",
+            feedback=CompilationFeedback(verbose_output="error"),
+            stats={"errors": 1, "compiler_warnings": 0, "linter_warnings": 0},
+        )
+
+    monkeypatch.setattr(main_module, "generate_contract", dummy_generate_contract)
+    monkeypatch.setattr(main_module, "_chat_completion", dummy_chat_completion)
+    monkeypatch.setattr(main_module, "compile_contract", dummy_compile_contract)
+
+    final_contract, _ = iterative_evaluation(BASE_PROMPT, SYSTEM_PROMPT, max_iterations=4, speculative=True)
+
+    # The first delta report changes the feedback once; after that it is stable,
+    # so the fourth iteration reuses the speculative request made during the third.
+    assert len(generate_calls) == 3
+    assert final_contract == "speculative contract"
+
+
+def test_iterative_evaluation_candidates(monkeypatch):
+    """
+    Test that every candidate is compiled in its own package and a compiling one is kept.
+    """
+    compiled = []
+
+    def dummy_generate_contracts(prompt: str, system_prompt: str, n: int) -> list:
+        return ["bad contract", "good contract", "other contract"][:n]
+
+    def dummy_compile_contract(source: str, project_dir: str = None) -> CompilationResult:
+        compiled.append((source, project_dir))
+        ok = source == "good contract"
+        return CompilationResult(
+            is_successful=ok,
+            status_message="ok" if ok else "dummy error",
+            feedback=CompilationFeedback(verbose_output=""),
+            stats={"errors": 0 if ok else 1, "compiler_warnings": 0, "linter_warnings": 0},
+        )
+
+    monkeypatch.setattr(main_module, "generate_contracts", dummy_generate_contracts)
+    monkeypatch.setattr(main_module, "compile_contract", dummy_compile_contract)
+
+    final_contract, fine_tuning_data = iterative_evaluation(
+        BASE_PROMPT, SYSTEM_PROMPT, max_iterations=3, num_candidates=3
+    )
+
+    assert final_contract == "good contract"
+    assert len(compiled) == 3
+    assert len({project_dir for _, project_dir in compiled}) == 3
+    assert fine_tuning_data[0]["is_successful"] is True
+
+
+def test_iterative_evaluation_candidates_fewest_errors(monkeypatch, capsys):
+    """
+    Test that the candidate with the fewest errors is kept when none compiles,
+    and that only its error tables are printed.
+    """
+    error_counts = {"three errors": 3, "one error": 1, "unparsed": None}
+
+    def dummy_generate_contracts(prompt: str, system_prompt: str, n: int) -> list:
+        return list(error_counts)
+
+    def dummy_compile_contract(source: str, project_dir: str = None) -> CompilationResult:
+        errors = error_counts[source]
+        return CompilationResult(
+            is_successful=False,
+            status_message="dummy error",
+            feedback=CompilationFeedback(verbose_output="", console_tables=f"tables of {source}\n"),
+            stats={} if errors is None else {"errors": errors, "compiler_warnings": 0, "linter_warnings": 0},
+        )
+
+    monkeypatch.setattr(main_module, "generate_contracts", dummy_generate_contracts)
+    monkeypatch.setattr(main_module, "compile_contract", dummy_compile_contract)
+
+    final_contract, _ = iterative_evaluation(BASE_PROMPT, SYSTEM_PROMPT, max_iterations=1, num_candidates=3)
 
+    assert final_contract == "one error"
+    output = capsys.readouterr().out
+    assert "tables of one error" in output
+    assert "tables of three errors" not in output
 
-def test_main_dark_mode_visualization(monkeypatch):
+
+def test_main_dark_mode_visualization(monkeypatch, tmp_path):
     """Test that the dark_mode argument is correctly passed to save_fine_tuning_data."""
     # Mock dependencies
     class MockPromptLoader:
+        def __init__(self, *args, **kwargs):
+            pass
         def get_prompt(self, *args, **kwargs):
             return ("test prompt", "test system prompt")
         def get_prompt_description(self, *args, **kwargs):
             return "Test description"
     
-    monkeypatch.setattr('neuromansui.main.PromptLoader', lambda *args, **kwargs: MockPromptLoader())
+    monkeypatch.setattr(main_module, "PromptLoader", MockPromptLoader)
     
     # Mock iterative_evaluation
-    monkeypatch.setattr('neuromansui.main.iterative_evaluation', lambda *args, **kwargs: ("final contract", ["iteration data"]))
+    monkeypatch.setattr(main_module, "iterative_evaluation", lambda *args, **kwargs: ("final contract", ["iteration data"]))
     
     # Mock save_fine_tuning_data
     mock_save_data_calls = []
     def mock_save_fine_tuning_data(data, path, dark_mode=False):
         mock_save_data_calls.append({"data": data, "path": path, "dark_mode": dark_mode})
     
-    monkeypatch.setattr('neuromansui.main.save_fine_tuning_data', mock_save_fine_tuning_data)
+    monkeypatch.setattr(main_module, "save_fine_tuning_data", mock_save_fine_tuning_data)
     
-    # Mock all file operations
+    # Pretend no output exists yet; the contract itself is written to tmp_path
     monkeypatch.setattr('os.path.exists', lambda path: False)
-    monkeypatch.setattr('os.makedirs', lambda *args, **kwargs: None)
-    
-    # Mock open to avoid file operations
-    mock_file = MagicMock()
-    mock_file.__enter__.return_value = mock_file
-    monkeypatch.setattr('builtins.open', lambda *args, **kwargs: mock_file)
     
     # Mock input to avoid user prompts
     monkeypatch.setattr('builtins.input', lambda prompt: 'y')
@@ -238,15 +474,77 @@ def test_main_dark_mode_visualization(monkeypatch):
         'main.py',
         '--prompt', 'test.prompt',
         '--module-name', 'TestModule',
-        '--save-dir', '/tmp',
+        '--save-dir', str(tmp_path),
         '--save-iterations',
         '--dark-mode'
     ])
     
     # Run main
-    from neuromansui.main import main
     main()
     
     # Check that save_fine_tuning_data was called with dark_mode=True
     assert len(mock_save_data_calls) > 0, "save_fine_tuning_data was not called"
-    assert mock_save_data_calls[0]['dark_mode'] is True 
\ No newline at end of file
+    assert mock_save_data_calls[0]['dark_mode'] is True
+    # The contract was moved into place, leaving no temporary file behind
+    saved_files = list(tmp_path.iterdir())
+    assert len(saved_files) == 1 and saved_files[0].suffix == ".move"
+    assert saved_files[0].read_text() == "final contract"
+
+
+def test_chart_theme_toggle_annotations(tmp_path):
+    """Test that the theme toggle restyles the summary box, watermark and count labels."""
+    iterations_data = [
+        {"iteration": 1, "total_errors": 2, "error_breakdown": {"E123001": {"count": 2, "level": "BlockingError", "message": "Dummy error"}}},
+        {"iteration": 2, "total_errors": 0, "error_breakdown": {}},
+    ]
+    generate_error_chart(iterations_data, str(tmp_path / "chart"), all_contracts=[DUMMY_SOURCE, DUMMY_SOURCE])
+
+    page = (tmp_path / "chart_error_chart.html").read_text()
+    themes_json = page.split("var chartThemes = ", 1)[1].split(";\n", 1)[0]
+    themes = json.loads(themes_json)
+
+    for mode, mode_theme in _CHART_THEMES.items():
+        annotations = themes["dark" if mode else "light"]["layout"]["annotations"]
+        by_name = {}
+        for annotation in annotations:
+            by_name.setdefault(annotation.get("name"), []).append(annotation)
+
+        [summary] = by_name["summary"]
+        assert summary["text"].startswith("<b>Summary Statistics</b><br>Total Errors: 2<br>Blocking Errors: 2<br>")
+        assert "1. Error: Dummy error (2)" in summary["text"]
+        assert summary["bgcolor"] == mode_theme["stats_bg"]
+        assert summary["bordercolor"] == mode_theme["stats_border"]
+        assert summary["font"]["color"] == mode_theme["text"]
+        [watermark] = by_name["watermark"]
+        assert watermark["text"] == "Sui Move Compiler Error Analysis"
+        assert watermark["font"]["color"] == mode_theme["watermark"]
+        [count_label] = by_name["count_label"]
+        assert count_label["text"] == "2"
+        assert count_label["font"]["color"] == mode_theme["count_label"]
+
+
+def test_resolve_output_paths(tmp_path):
+    """Test that every output file of a run is named after the same contract name."""
+    args = _build_parser().parse_args(['--save-dir', str(tmp_path / "out"), '--name', 'token'])
+    paths = resolve_output_paths(args)
+
+    assert (tmp_path / "out").is_dir()
+    assert paths.contract_path == str(tmp_path / "out" / "token.move")
+    assert paths.iterations_path == str(tmp_path / "out" / "token_iterations")
+    assert paths.test_path == str(tmp_path / "out" / "token_test.move")
+
+    # The deprecated --output path sets the directory and name of the other files
+    args = _build_parser().parse_args(['--output', str(tmp_path / "legacy" / "coin.move")])
+    paths = resolve_output_paths(args)
+    assert paths.contract_name == "coin"
+    assert paths.test_path == str(tmp_path / "legacy" / "coin_test.move")
+
+
+def test_candidates_must_be_positive():
+    """Test that fewer than one candidate per iteration is rejected."""
+    with pytest.raises(SystemExit):
+        _build_parser().parse_args(['--candidates', '0'])
+    assert _build_parser().parse_args(['--candidates', '2']).candidates == 2
+
+    with pytest.raises(ValueError):
+        iterative_evaluation(BASE_PROMPT, SYSTEM_PROMPT, num_candidates=0)
@@ -0,0 +1,55 @@
+import pytest
+import yaml
+
+from neuromansui.prompt_loader import PromptLoader, DEFAULT_SYSTEM_PROMPT
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    """Keep the parsed-file cache of every test out of the user's cache directory."""
+    cache_home = tmp_path / "cache"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache_home))
+    return cache_home
+
+
+def test_prompt_loader_loads_namespaces_lazily(tmp_path):
+    """
+    Test that a prompt lookup only parses its own namespace, and listing parses the rest.
+    """
+    (tmp_path / "alpha.yaml").write_text("greet:\n  content: Hello\n  description: Says hello\n")
+    (tmp_path / "beta.yml").write_text("bye:\n  content: Bye\n  system_prompt: Be brief.\n")
+
+    loader = PromptLoader(prompts_dir=str(tmp_path))
+    assert loader.prompts == {}
+
+    assert loader.get_prompt("alpha.greet") == ("Hello", DEFAULT_SYSTEM_PROMPT)
+    assert list(loader.prompts) == ["alpha"]
+    assert loader.get_prompt("missing.greet") == (None, None)
+
+    assert sorted(loader.list_prompts()) == ["alpha.greet", "beta.bye"]
+    assert loader.get_prompt("beta.bye") == ("Bye", "Be brief.")
+    assert loader.get_prompt_description("alpha.greet") == "Says hello"
+
+
+def test_prompt_loader_reuses_parsed_files_until_they_change(tmp_path, monkeypatch, cache_home):
+    """
+    Test that an unchanged prompt file is read from the cache instead of parsed again.
+    """
+    prompt_file = tmp_path / "alpha.yaml"
+    prompt_file.write_text("greet:\n  content: Hello\n")
+    assert PromptLoader(prompts_dir=str(tmp_path)).get_prompt("alpha.greet")[0] == "Hello"
+    # The cache is kept in the user's cache directory, not next to the prompts
+    assert len(list((cache_home / "neuromansui").glob("prompts-*.pkl"))) == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["alpha.yaml", "cache"]
+
+    parsed = []
+    real_load = yaml.load
+    monkeypatch.setattr(yaml, "load", lambda *args, **kwargs: parsed.append(1) or real_load(*args, **kwargs))
+
+    assert PromptLoader(prompts_dir=str(tmp_path)).get_prompt("alpha.greet")[0] == "Hello"
+    assert parsed == []
+
+    prompt_file.write_text("greet:\n  content: Hi there\n")
+    assert PromptLoader(prompts_dir=str(tmp_path)).get_prompt("alpha.greet")[0] == "Hi there"
+    assert parsed == [1]
+